@@ -1,109 +1,268 @@
 # backend/api.py
 import os
-import time
-import uuid
+import re
+import shutil
+from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from .planners.prompt_parser import parse_prompt
-from .geometry.voxelizer import make_voxels
-from .optimize.greedy_packer import pack_greedy
-from .export.ldraw_writer import write_assembly
-from .export.bom import make_bom, write_bom
-from .export.instructions import write_instruction_set
+from .geometry.voxel_io import FORMATS, load_voxels
+from .optimize.parts import CATALOGS, DEFAULT_CATALOG
+from .export.lpub_runner import get_runner
+from .export.instructions import load_session_model, render_step_page
 from .export.pdf_fallback import make_pdf_from_pngs
-from .planners.step_planner import plan_steps_connectivity_batched
+from .pipeline import PLANNERS, SOLVERS, new_session, run_pipeline, run_voxel_pipeline
+from .utils.admission import AdmissionRejected, get_controller
+from .utils.cost_model import estimate, estimate_grid
+from .utils.session_store import get_store
 
-app = FastAPI(title="Prompt LEGO MVP (Headless, Batched Steps)")
+OUTPUTS = "outputs"
+MAX_VOXEL_UPLOAD = int(os.getenv("MAX_VOXEL_UPLOAD_MB", "64")) * 1024 * 1024
+PAGE_PREFETCH = int(os.getenv("PAGE_PREFETCH", "2"))   # pages rendered ahead of the one requested
+STORE_COMPACT_INTERVAL = float(os.getenv("STORE_COMPACT_INTERVAL_S", "300"))
+
+def session_store():
+    """The store for OUTPUTS; the LPub3D cache counts towards its quota."""
+    return get_store(OUTPUTS, caches=[get_runner().cache_dir])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    store = session_store()
+    store.start_compactor(STORE_COMPACT_INTERVAL)
+    try:
+        yield
+    finally:
+        store.stop_compactor()
+        get_controller().shutdown()
+
+app = FastAPI(title="Prompt LEGO MVP (Headless, Batched Steps)", lifespan=lifespan)
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
 
 class PromptIn(BaseModel):
     prompt: str
     seed: Optional[int] = 42
-    solver: Optional[str] = "greedy"
+    solver: Optional[str] = "greedy"   # or "ilp": CP-SAT plate packer (OR-Tools)
     batch_size: Optional[int] = 8
+    profile: Optional[bool] = False   # per-stage profile artifacts under <session>/profile/
+    lpub3d: Optional[bool] = False    # also render a PDF with LPub3D (pooled, cached)
+    catalog: Optional[str] = DEFAULT_CATALOG   # "basic" (default, 4 plates), "plates" or "full"
+    pages: Optional[str] = "lazy"     # "lazy": render step pages on first GET; "eager": all up front
+    planner: Optional[str] = "batched"   # or "layered": per-layer steps, planned serially here
 
-@app.post("/from_prompt")
-def from_prompt(inp: PromptIn):
-    # --- parse & session
+def _page_urls(session_id: str, lazy: bool) -> dict:
+    if not lazy:
+        return {}
+    return {
+        "page_url": f"/sessions/{session_id}/steps/{{n}}.png",
+        "pdf_url": f"/sessions/{session_id}/instructions.pdf",
+    }
+
+def _add_session_links(result: dict, session_id: str, lazy: bool):
+    outputs = result["outputs"]
+    if "instructions_html" in outputs:
+        outputs["instructions_url"] = f"/sessions/{session_id}/instructions.html"
+        if lazy:
+            outputs["instructions_pdf_url"] = _page_urls(session_id, True)["pdf_url"]
+
+def _parse(inp: PromptIn):
     spec = parse_prompt(inp.prompt)
     if inp.seed is not None:
         spec.seed = inp.seed
+    return spec
 
-    ts = time.strftime("%Y%m%d_%H%M%S")
-    session_id = f"session_{ts}_{uuid.uuid4().hex[:6]}"
-    outdir = os.path.join("outputs", session_id)
-    os.makedirs(outdir, exist_ok=True)
-
-    # --- voxelize
-    t0 = time.time()
-    vox = make_voxels(spec)  # ndarray [H,W,L]
-    H, W, L = vox.shape
-    print(f"[TIMER] voxelize: {time.time()-t0:.2f}s  grid=({H},{W},{L})")
-
-    # --- pack parts
-    t1 = time.time()
-    placements = pack_greedy(vox, seed=spec.seed)
-    print(f"[TIMER] pack_greedy: {time.time()-t1:.2f}s  placements={len(placements)}")
-
-    # --- plan steps (connectivity + small batches)
-    batch = int(inp.batch_size) if inp.batch_size and inp.batch_size > 0 else 8
-    t2 = time.time()
-    placements, step_count = plan_steps_connectivity_batched(placements, batch_size=batch)
-    print(f"[TIMER] plan_steps: {time.time()-t2:.2f}s  steps={step_count}  batch={batch}")
-
-    # --- write LDraw assembly (optional, for LPub3D later)
-    t3 = time.time()
-    model_path = write_assembly(placements, outdir, H)
-    print(f"[TIMER] write_assembly: {time.time()-t3:.2f}s")
-
-    # --- BOM
-    t4 = time.time()
-    items = make_bom(placements)
-    csv_path, json_path = write_bom(items, outdir)
-    print(f"[TIMER] bom: {time.time()-t4:.2f}s  items={len(items)}")
-
-    # --- Render pages (PNG with PLI) — first pass with no PDF link
-    t5 = time.time()
-    write_instruction_set(
-        placements=placements,
-        outdir=outdir,
-        H=H, W=W, L=L,
-        spec=spec.model_dump(),
-        pdf_path=None,
-        step_count=step_count
-    )
-    print(f"[TIMER] render PNGs: {time.time()-t5:.2f}s")
-
-    # --- Stitch PDF
-    t6 = time.time()
-    pdf_path = make_pdf_from_pngs(outdir)
-    print(f"[TIMER] stitch PDF: {time.time()-t6:.2f}s")
-
-    # --- Update HTML with a working PDF link
-    write_instruction_set(
-        placements=placements,
-        outdir=outdir,
-        H=H, W=W, L=L,
-        spec=spec.model_dump(),
-        pdf_path=pdf_path,
-        step_count=step_count
-    )
-
+def _options(inp: PromptIn) -> dict:
     return {
-        "session": session_id,
-        "spec": spec.model_dump(),
-        "counts": {
-            "placements": len(placements),
-            "studs": int(vox.sum()),
-            "steps": step_count,
-        },
-        "outputs": {
-            "ldr": model_path,
-            "bom_csv": csv_path,
-            "bom_json": json_path,
-            "instructions_html": os.path.join(outdir, "instructions.html"),
-            "instructions_pdf": pdf_path if (pdf_path and os.path.isfile(pdf_path)) else None,
-        },
+        "batch_size": inp.batch_size or 8,
+        "catalog": inp.catalog or DEFAULT_CATALOG,
+        "solver": inp.solver or "greedy",
+        "planner": inp.planner or "batched",
     }
+
+def _validate(catalog, pages, planner, solver):
+    if catalog and catalog not in CATALOGS:
+        raise HTTPException(status_code=400, detail=f"catalog must be one of {CATALOGS}")
+    if pages and pages not in ("lazy", "eager"):
+        raise HTTPException(status_code=400, detail="pages must be 'lazy' or 'eager'")
+    if planner and planner not in PLANNERS:
+        raise HTTPException(status_code=400, detail=f"planner must be one of {PLANNERS}")
+    if solver and solver not in SOLVERS:
+        raise HTTPException(status_code=400, detail=f"solver must be one of {SOLVERS}")
+
+def _estimate_spec(spec, inp: PromptIn) -> dict:
+    return estimate(spec, pages=inp.pages or "lazy", **_options(inp))
+
+def _rejected(e: AdmissionRejected, est: dict) -> HTTPException:
+    headers = {"Retry-After": "10"} if e.status == 429 else None
+    return HTTPException(status_code=e.status, detail={"reason": e.reason, "estimate": est}, headers=headers)
+
+def _admit(est: dict) -> dict:
+    try:
+        return get_controller().admit(est)
+    except AdmissionRejected as e:
+        raise _rejected(e, est)
+
+async def _run_admitted(decision: dict, est: dict, outdir: str, fn, *args, **kwargs):
+    try:
+        return await get_controller().run(decision, fn, *args, **kwargs)
+    except AdmissionRejected as e:
+        shutil.rmtree(outdir, ignore_errors=True)   # the session never ran
+        raise _rejected(e, est)
+
+async def _add_lpub_pdf(result: dict, outdir: str):
+    model_path = result["outputs"].get("ldr")
+    if model_path:
+        result["outputs"]["lpub3d_pdf"] = await get_runner().render(model_path, outdir)
+
+@app.post("/estimate")
+def estimate_prompt(inp: PromptIn):
+    """Predicted counts, per-stage seconds and peak memory for a /from_prompt
+    request, and how admission control would route it. Nothing is run."""
+    _validate(inp.catalog, inp.pages, inp.planner, inp.solver)
+    est = _estimate_spec(_parse(inp), inp)
+    return {"estimate": est, "admission": get_controller().decide(est)}
+
+@app.get("/healthz")
+def healthz():
+    return {"ok": True, "pid": os.getpid()}
+
+@app.get("/store/metrics")
+def store_metrics():
+    return session_store().metrics()
+
+@app.get("/admission/metrics")
+def admission_metrics():
+    return get_controller().metrics()
+
+@app.post("/from_prompt")
+async def from_prompt(inp: PromptIn):
+    _validate(inp.catalog, inp.pages, inp.planner, inp.solver)
+    # parsed once (it may call a remote parser); the estimate and the run share the spec
+    spec = await run_in_threadpool(_parse, inp)
+    est = _estimate_spec(spec, inp)
+    decision = _admit(est)   # over-budget requests are refused before a session exists
+    session_id, outdir = new_session(OUTPUTS)
+    # CPU-bound pipeline runs off the event loop (threads, or the heavy process
+    # pool for large estimates); LPub3D renders are awaited
+    result = await _run_admitted(decision, est, outdir, run_pipeline, spec, outdir,
+                                 profile=bool(inp.profile), **_options(inp),
+                                 **_page_urls(session_id, inp.pages != "eager"))
+    result["estimate"] = est
+    _add_session_links(result, session_id, inp.pages != "eager")
+    if inp.lpub3d:
+        await _add_lpub_pdf(result, outdir)
+    # finished writing: move the artifacts into the shared content store
+    result["store"] = await run_in_threadpool(session_store().commit, outdir)
+    return {"session": session_id, **result}
+
+@app.get("/lpub3d/metrics")
+def lpub3d_metrics():
+    return get_runner().metrics()
+
+@app.post("/from_voxels")
+async def from_voxels(request: Request, format: str = "npy", seed: int = 42, batch_size: int = 8,
+                      profile: bool = False, lpub3d: bool = False, catalog: str = DEFAULT_CATALOG,
+                      pages: str = "lazy", planner: str = "batched", solver: str = "greedy"):
+    """Raw request body is a voxel file (.npy / .npz / .vox, see geometry.voxel_io).
+    The body is streamed to the session directory and memory-mapped from there.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {FORMATS}")
+    _validate(catalog, pages, planner, solver)
+    session_id, outdir = new_session(OUTPUTS)
+    try:
+        return await _voxels_session(request, session_id, outdir, format, seed, profile, lpub3d, pages,
+                                     {"batch_size": batch_size, "catalog": catalog, "solver": solver,
+                                      "planner": planner})
+    except ValueError as e:   # voxel_io reports every unreadable upload as ValueError
+        shutil.rmtree(outdir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        # failed requests (413, 429, 500, cancelled) leave no session or partial upload behind
+        shutil.rmtree(outdir, ignore_errors=True)
+        raise
+
+async def _voxels_session(request: Request, session_id: str, outdir: str, format: str, seed: int,
+                          profile: bool, lpub3d: bool, pages: str, opts: dict) -> dict:
+    src = os.path.join(outdir, f"input.{format}")
+    size = 0
+    with open(src, "wb") as fh:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_VOXEL_UPLOAD:
+                raise HTTPException(status_code=413, detail=f"voxel upload exceeds {MAX_VOXEL_UPLOAD} bytes")
+            fh.write(chunk)
+
+    shape = (await run_in_threadpool(load_voxels, src, format)).shape
+    est = estimate_grid(*shape, category="imported", pages=pages, **opts)
+    decision = _admit(est)
+    result = await _run_admitted(
+        decision, est, outdir, run_voxel_pipeline, src, outdir,
+        fmt=format, seed=seed, profile=profile, **opts, **_page_urls(session_id, pages != "eager"),
+    )
+    result["outputs"]["voxels"] = src
+    result["estimate"] = est
+    _add_session_links(result, session_id, pages != "eager")
+    if lpub3d:
+        await _add_lpub_pdf(result, outdir)
+    # finished writing: move the artifacts into the shared content store
+    result["store"] = await run_in_threadpool(session_store().commit, outdir)
+    return {"session": session_id, **result}
+
+# ===== Sessions: lazily rendered manual =====
+
+def _session_dir(session_id: str) -> str:
+    if not _SESSION_ID.match(session_id):
+        raise HTTPException(status_code=404, detail="unknown session")
+    outdir = os.path.join(OUTPUTS, session_id)
+    if not os.path.isdir(outdir):
+        raise HTTPException(status_code=404, detail="unknown session")
+    session_store().touch(outdir)
+    return outdir
+
+def _prefetch(outdir: str, first: int, count: int):
+    for s in range(first, first + count):
+        try:
+            render_step_page(outdir, s)
+        except IndexError:
+            break
+
+@app.get("/sessions/{session_id}/steps/{n}.png")
+def step_page(session_id: str, n: int, background: BackgroundTasks, prefetch: int = PAGE_PREFETCH):
+    outdir = _session_dir(session_id)
+    try:
+        path = render_step_page(outdir, n)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="session has no step data")
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if prefetch > 0:
+        background.add_task(_prefetch, outdir, n + 1, min(prefetch, 16))
+    return FileResponse(path, media_type="image/png")
+
+@app.get("/sessions/{session_id}/instructions.html")
+def instructions_html(session_id: str):
+    path = os.path.join(_session_dir(session_id), "instructions.html")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="session has no manual")
+    return FileResponse(path, media_type="text/html")
+
+@app.get("/sessions/{session_id}/instructions.pdf")
+def instructions_pdf(session_id: str):
+    """Renders any pages not yet cached, then stitches (and caches) the PDF."""
+    outdir = _session_dir(session_id)
+    pdf_path = os.path.join(outdir, "instructions.pdf")
+    if not os.path.isfile(pdf_path):
+        try:
+            steps = load_session_model(outdir)["step_count"]
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="session has no step data")
+        for s in range(steps):
+            render_step_page(outdir, s)
+        if not make_pdf_from_pngs(outdir):
+            raise HTTPException(status_code=404, detail="no pages to stitch")
+    return FileResponse(pdf_path, media_type="application/pdf")
@@ -0,0 +1,191 @@
+# backend/batch.py
+"""Offline batch runner: python -m backend.batch items.jsonl results.jsonl [-j N]
+
+Each input line is one of
+  {"id": "...", "prompt": "...", "seed": 42, "batch_size": 8}
+  {"id": "...", "spec": {...DesignSpec fields...}}
+  {...DesignSpec fields...}                      (bare spec)
+  {"id": "...", "voxels": "grid.npy", "format": "npy"}   (pre-built grid, see geometry.voxel_io)
+Items missing an "id" are keyed by their line number. Results (one JSON line per
+item, with per-stage timings) are appended to the output file; items already
+recorded there with status "ok" (run at least as far as the requested stage) are
+skipped, so an interrupted run can be restarted.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Set
+
+from .optimize.parts import CATALOGS, DEFAULT_CATALOG
+from .pipeline import PLANNERS, STAGES, run_pipeline, run_voxel_pipeline
+from .planners.prompt_parser import parse_prompt
+from .utils.session_store import SessionStore, remove_tree
+from .utils.spec_schema import DesignSpec
+
+def _item_id(item: Dict, lineno: int) -> str:
+    return str(item.get("id", f"line_{lineno}"))
+
+def _safe_dirname(item_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", item_id).strip(".") or "item"
+
+def read_items(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line)
+            item["id"] = _item_id(item, lineno)
+            yield item
+
+def _stage_rank(stage: Optional[str]) -> int:
+    return STAGES.index(stage) if stage else len(STAGES) - 1
+
+def completed_ids(path: str, stop_after: Optional[str] = None) -> Set[str]:
+    need = _stage_rank(stop_after)
+    done: Set[str] = set()
+    if not os.path.isfile(path):
+        return done
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            if rec.get("status") == "ok" and _stage_rank(rec.get("stop_after")) >= need:
+                done.add(str(rec.get("id")))
+    return done
+
+def _spec_for(item: Dict) -> DesignSpec:
+    if "prompt" in item:
+        spec = parse_prompt(item["prompt"])
+    elif "spec" in item:
+        spec = DesignSpec(**item["spec"])
+    else:
+        fields = {k: v for k, v in item.items() if k in DesignSpec.model_fields}
+        spec = DesignSpec(**fields)
+    if item.get("seed") is not None:
+        spec.seed = int(item["seed"])
+    return spec
+
+def run_item(job: Dict) -> Dict:
+    """Worker entry point; never raises so one bad item can't stop the pool."""
+    item = job["item"]
+    rec = {"id": item["id"], "status": "ok", "stop_after": job["stop_after"]}
+    t0 = time.time()
+    try:
+        outdir = os.path.join(job["outputs"], _safe_dirname(item["id"]))
+        # start from an empty directory: a re-run may produce fewer pages than the
+        # last one, and the pdf stage stitches every page it finds
+        remove_tree(outdir)
+        os.makedirs(outdir, exist_ok=True)
+        batch_size = item.get("batch_size", job["batch_size"])
+        if "voxels" in item:
+            res = run_voxel_pipeline(
+                item["voxels"], outdir,
+                fmt=item.get("format"),
+                seed=int(item.get("seed", 42)),
+                batch_size=batch_size,
+                stop_after=job["stop_after"],
+                profile=job["profile"],
+                catalog=item.get("catalog", job["catalog"]),
+                planner=item.get("planner", job["planner"]),
+                plan_executor=job.get("plan_executor"),
+            )
+        else:
+            res = run_pipeline(
+                _spec_for(item), outdir,
+                batch_size=batch_size,
+                stop_after=job["stop_after"],
+                profile=job["profile"],
+                catalog=item.get("catalog", job["catalog"]),
+                planner=item.get("planner", job["planner"]),
+                plan_executor=job.get("plan_executor"),
+            )
+        rec.update(res)
+        rec["outdir"] = outdir
+        # identical artifacts across items are stored once (no quota for batch runs)
+        rec["store"] = SessionStore(job["outputs"]).commit(outdir)
+    except Exception as e:
+        rec["status"] = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+        rec["traceback"] = traceback.format_exc()
+    rec["elapsed"] = round(time.time() - t0, 4)
+    return rec
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m backend.batch", description=__doc__.split("\n\n")[0])
+    ap.add_argument("input", help="JSONL of prompts, DesignSpecs or voxel files")
+    ap.add_argument("output", help="JSONL results file (appended; used to resume)")
+    ap.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--outputs", default="outputs/batch", help="root directory for per-item artifacts")
+    ap.add_argument("--batch-size", type=int, default=8, help="default planner batch size")
+    ap.add_argument("--stop-after", choices=STAGES, default=None, help="skip stages after this one")
+    ap.add_argument("--catalog", choices=CATALOGS, default=DEFAULT_CATALOG, help="part library for packing")
+    ap.add_argument("--planner", choices=PLANNERS, default="batched",
+                    help="step planner (layered runs serially inside pool workers)")
+    ap.add_argument("--plan-workers", type=int, default=1,
+                    help="with -j 1 and --planner layered: processes planning layers in parallel")
+    ap.add_argument("--profile", action="store_true", help="write per-stage profiles under each item's outdir")
+    args = ap.parse_args(argv)
+
+    done = completed_ids(args.output, args.stop_after)
+    jobs = [
+        {"item": item, "outputs": args.outputs, "batch_size": args.batch_size, "stop_after": args.stop_after,
+         "profile": args.profile, "catalog": args.catalog,
+         "planner": args.planner}
+        for item in read_items(args.input)
+        if item["id"] not in done
+    ]
+    print(f"[INFO] batch: {len(jobs)} to run, {len(done)} already complete, workers={args.workers}", file=sys.stderr)
+    if not jobs:
+        return 0
+
+    failed = 0
+    t0 = time.time()
+    out_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(out_dir, exist_ok=True)
+    plan_pool = None
+    with open(args.output, "a", encoding="utf-8") as out:
+        if args.workers <= 1:
+            if args.plan_workers > 1:
+                # one pool for the whole run, shared by every item's layered planner
+                plan_pool = ProcessPoolExecutor(max_workers=args.plan_workers)
+                for job in jobs:
+                    job["plan_executor"] = plan_pool
+            results = map(run_item, jobs)
+            pool = None
+        else:
+            # maxtasksperchild bounds memory growth from large models
+            pool = Pool(processes=args.workers, maxtasksperchild=32)
+            results = pool.imap_unordered(run_item, jobs)
+        try:
+            for n, rec in enumerate(results, 1):
+                out.write(json.dumps(rec) + "\n")
+                out.flush()
+                if rec["status"] != "ok":
+                    failed += 1
+                    print(f"[WARN] {rec['id']}: {rec['error']}", file=sys.stderr)
+                print(f"[INFO] {n}/{len(jobs)} {rec['id']} {rec['status']} {rec['elapsed']:.2f}s", file=sys.stderr)
+        except BaseException:
+            if pool is not None:
+                pool.terminate()
+            raise
+        finally:
+            if plan_pool is not None:
+                plan_pool.shutdown(cancel_futures=True)
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"[INFO] batch done in {time.time()-t0:.1f}s  failed={failed}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,25 @@
-from typing import List, Dict
-from collections import defaultdict
+from typing import List, Dict, Optional
 import csv, json, os
+from ..planners.step_index import StepIndex
+from ..utils.fileio import atomic_open
 
-def make_bom(placements: List[Dict]):
-    agg = defaultdict(int)
-    for p in placements:
-        key = (p["ldraw"], p["name"], p["color"])
-        agg[key] += 1
-    items = []
-    for (ldraw, name, color), qty in sorted(agg.items(), key=lambda x:(x[0][0], x[0][2])):
-        items.append({
-            "part_id": ldraw.replace(".dat",""),
-            "name": name,
-            "color": color,
-            "quantity": qty
-        })
-    return items
+def make_bom(placements: List[Dict], index: Optional[StepIndex] = None):
+    # totals come from the shared step index (built here if not supplied)
+    if index is None:
+        index = StepIndex(placements)
+    return index.bom()
 
 def write_bom(items, outdir):
     os.makedirs(outdir, exist_ok=True)
     # CSV
     csv_path = os.path.join(outdir, "bom.csv")
-    with open(csv_path, "w", newline="") as f:
+    with atomic_open(csv_path, "w", newline="") as f:
         w = csv.DictWriter(f, fieldnames=["part_id","name","color","quantity"])
         w.writeheader()
         for it in items:
             w.writerow(it)
     # JSON
     json_path = os.path.join(outdir, "bom.json")
-    with open(json_path, "w") as f:
+    with atomic_open(json_path, "w") as f:
         json.dump(items, f, indent=2)
     return csv_path, json_path
@@ -1,8 +1,15 @@
 # backend/export/instructions.py
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
+import json
 import os
-from collections import Counter
-from PIL import Image, ImageDraw
+import threading
+from functools import lru_cache
+from ..optimize.parts import PART_BY_LDRAW, short_label
+from ..planners.step_index import StepIndex
+from ..utils.fileio import atomic_open
+
+if TYPE_CHECKING:  # PIL is imported on first render, not at server start
+    from PIL import Image, ImageDraw
 
 # ===== Tunables =====
 SCALE      = 64        # pixels per stud (crisper; PDF stays sharp)
@@ -10,9 +17,10 @@ PLI_COLS   = 2         # how many columns in the parts list panel
 PLI_TH     = 56        # per-item thumbnail height (px)
 PLI_GAP    = 10        # gap between rows/cols in PLI
 PLI_W_COL  = 260       # width per PLI column (thumb+labels)
+THUMB_W    = 112       # part thumbnail width inside a PLI cell
 MARGIN     = 24
 GRID_ALPHA = 220
-MAX_PAGES  = 300       # safety cap
+MAX_BOARD_PX = 4096    # large imported grids get a smaller per-stud scale
 
 COLOR_MAP = {
     "red": (220, 60, 60),
@@ -27,13 +35,19 @@ COLOR_MAP = {
 def _rgb(name: str): 
     return COLOR_MAP.get(name, (180, 180, 180))
 
-def _short(n: str) -> str:
-    # short label e.g. "Plate 2x4" -> "2x4"
-    return n.split(" ", 1)[1] if " " in n else n
+def _scale(W: int, L: int) -> int:
+    return max(4, min(SCALE, MAX_BOARD_PX // max(W, L, 1)))
+
+def page_size(W: int, L: int) -> Tuple[int, int]:
+    """Pixel size (w, h) of one step page for a W×L stud board."""
+    scale = _scale(W, L)
+    pli_w = PLI_COLS * PLI_W_COL + (PLI_COLS-1)*PLI_GAP
+    return MARGIN + L*scale + MARGIN + pli_w + MARGIN, MARGIN + W*scale + MARGIN
 
-def _canvas(W: int, L: int) -> Tuple[Image.Image, ImageDraw.ImageDraw, int, int, int, int, int]:
-    board_w  = L * SCALE
-    board_h  = W * SCALE
+def _canvas(W: int, L: int, scale: int = SCALE) -> Tuple["Image.Image", "ImageDraw.ImageDraw", int, int, int, int, int]:
+    from PIL import Image, ImageDraw
+    board_w  = L * scale
+    board_h  = W * scale
     pli_w    = PLI_COLS * PLI_W_COL + (PLI_COLS-1)*PLI_GAP
     img_w    = MARGIN + board_w + MARGIN + pli_w + MARGIN
     img_h    = MARGIN + board_h + MARGIN
@@ -44,9 +58,9 @@ def _canvas(W: int, L: int) -> Tuple[Image.Image, ImageDraw.ImageDraw, int, int,
     # grid
     grid_color = (220,220,220,GRID_ALPHA)
     for x in range(L+1):
-        d.line([(gx + x*SCALE, gy), (gx + x*SCALE, gy + board_h)], fill=grid_color, width=1)
+        d.line([(gx + x*scale, gy), (gx + x*scale, gy + board_h)], fill=grid_color, width=1)
     for y in range(W+1):
-        d.line([(gx, gy + y*SCALE), (gx + board_w, gy + y*SCALE)], fill=grid_color, width=1)
+        d.line([(gx, gy + y*scale), (gx + board_w, gy + y*scale)], fill=grid_color, width=1)
     # PLI panel origin
     px = gx + board_w + MARGIN
     py = gy
@@ -55,24 +69,19 @@ def _canvas(W: int, L: int) -> Tuple[Image.Image, ImageDraw.ImageDraw, int, int,
     d.text((px, py), "Parts this step", fill=(25,25,25))
     return img, d, gx, gy, px, py, board_h
 
-def _draw_rect_label(d: ImageDraw.ImageDraw, x0,y0,x1,y1, fill, text):
+def _draw_rect_label(d: "ImageDraw.ImageDraw", x0,y0,x1,y1, fill, text):
     d.rectangle((x0,y0,x1,y1), fill=fill, outline=(30,30,30))
     if (x1-x0) >= 64 and (y1-y0) >= 24:
         d.text((x0+6, y0+6), text, fill=(0,0,0))
 
-def _count_by_part_color(parts: List[Dict]):
-    c = Counter((p["ldraw"], p["color"], _short(p.get("name","")) or p["ldraw"]) for p in parts)
-    # sort: by ldraw then color
-    return sorted(((ld, col, label, n) for (ld, col, label), n in c.items()), key=lambda t:(t[0], t[1]))
-
 def _stud_color(base):
     # slightly darker circles on top
     return tuple(max(0, int(c*0.7)) for c in base)
 
-def _draw_stud_topdown(d: ImageDraw.ImageDraw, x, y, r, color):
+def _draw_stud_topdown(d: "ImageDraw.ImageDraw", x, y, r, color):
     d.ellipse((x-r, y-r, x+r, y+r), outline=(30,30,30), fill=_stud_color(color))
 
-def _draw_part_thumb_topdown(d: ImageDraw.ImageDraw, box: Tuple[int,int,int,int], color_name: str, l: int, w: int):
+def _draw_part_thumb_topdown(d: "ImageDraw.ImageDraw", box: Tuple[int,int,int,int], color_name: str, l: int, w: int):
     """
     Top-down 2.5D: draw a rectangle l×w studs with stud bumps.
     l = length in studs (X direction), w = width in studs (Y direction)
@@ -95,37 +104,63 @@ def _draw_part_thumb_topdown(d: ImageDraw.ImageDraw, box: Tuple[int,int,int,int]
             sy = int(y0 + pady + cy*rh + rh/2)
             _draw_stud_topdown(d, sx, sy, r, fill)
 
+# PLI thumbnails depend only on (color, l, w): each is drawn once per process and
+# pasted onto pages. prerender_sprites() fills the cache up front so forked
+# workers share it copy-on-write.
+_THUMB_SIZE = (THUMB_W + 1, PLI_TH - 8 + 1)
+_sprites: Dict[Tuple[str, int, int], "Image.Image"] = {}
+_sprites_lock = threading.Lock()
+
+def _part_sprite(color_name: str, l: int, w: int) -> "Image.Image":
+    key = (color_name, l, w)
+    sprite = _sprites.get(key)
+    if sprite is None:
+        from PIL import Image, ImageDraw
+        sprite = Image.new("RGB", _THUMB_SIZE)
+        _draw_part_thumb_topdown(ImageDraw.Draw(sprite), (0, 0, _THUMB_SIZE[0]-1, _THUMB_SIZE[1]-1), color_name, l, w)
+        with _sprites_lock:
+            sprite = _sprites.setdefault(key, sprite)
+    return sprite
+
+def prerender_sprites() -> int:
+    """Draws the thumbnail of every catalog part in every palette color."""
+    for part in PART_BY_LDRAW.values():
+        for color in COLOR_MAP:
+            _part_sprite(color, part["l"], part["w"])
+    return len(_sprites)
+
 def _pli_cell_rect(px, py, col, row):
     x = px + col*(PLI_W_COL + PLI_GAP)
     y = py + 28 + row*(PLI_TH + PLI_GAP)
     return (x, y, x + PLI_W_COL, y + PLI_TH)
 
-def draw_step_image(placements: List[Dict], step_id: int, W: int, L: int, out_path: str):
-    img, d, gx, gy, px, py, board_h = _canvas(W, L)
+def draw_step_image(placements: List[Dict], step_id: int, W: int, L: int, out_path: str,
+                    index: Optional[StepIndex] = None):
+    if index is None:
+        index = StepIndex(placements)
+    scale = _scale(W, L)
+    img, d, gx, gy, px, py, board_h = _canvas(W, L, scale)
 
     # previous steps dimmed
-    for p in placements:
-        if int(p["step"]) >= step_id:
-            continue
-        x0 = gx + p["x"]*SCALE; y0 = gy + p["y"]*SCALE
-        x1 = gx + (p["x"]+p["l"])*SCALE; y1 = gy + (p["y"]+p["w"])*SCALE
+    for p in index.before(step_id):
+        x0 = gx + p["x"]*scale; y0 = gy + p["y"]*scale
+        x1 = gx + (p["x"]+p["l"])*scale; y1 = gy + (p["y"]+p["w"])*scale
         fill = tuple(int(c*0.35) for c in _rgb(p["color"]))
-        _draw_rect_label(d, x0,y0,x1,y1, fill, _short(p.get("name","")))
+        _draw_rect_label(d, x0,y0,x1,y1, fill, short_label(p.get("name","")))
 
     # current step
-    new_parts = [p for p in placements if int(p["step"]) == step_id]
-    for p in new_parts:
-        x0 = gx + p["x"]*SCALE; y0 = gy + p["y"]*SCALE
-        x1 = gx + (p["x"]+p["l"])*SCALE; y1 = gy + (p["y"]+p["w"])*SCALE
-        _draw_rect_label(d, x0,y0,x1,y1, _rgb(p["color"]), _short(p.get("name","")))
+    for p in index.step(step_id):
+        x0 = gx + p["x"]*scale; y0 = gy + p["y"]*scale
+        x1 = gx + (p["x"]+p["l"])*scale; y1 = gy + (p["y"]+p["w"])*scale
+        _draw_rect_label(d, x0,y0,x1,y1, _rgb(p["color"]), short_label(p.get("name","")))
 
     # PLI — multi-column layout inside the same page height
-    rows = _count_by_part_color(new_parts)
+    rows = index.pli(step_id)
     if rows:
         # how many rows fit per column?
         rows_per_col = max(1, int((board_h - 36) // (PLI_TH + PLI_GAP)))
         col = row = 0
-        for (ldraw, color, label, qty) in rows:
+        for (ldraw, color, label, qty, l, w) in rows:
             # break column
             if row >= rows_per_col:
                 col += 1; row = 0
@@ -133,24 +168,74 @@ def draw_step_image(placements: List[Dict], step_id: int, W: int, L: int, out_pa
             # for *very* big steps, reduce batch size in planner.
             cell = _pli_cell_rect(px, py, col, row)
             # thumb rect within cell
-            tx0, ty0, tx1, ty1 = (cell[0]+6, cell[1]+4, cell[0]+6+112, cell[1]+4+PLI_TH-8)
-            # parse size from label if present (e.g., "2x4")
-            l = w = 1
-            # prefer placements info later if needed; for now parse l×w if label has it
-            if "x" in label:
-                parts = label.lower().split("x")
-                try:
-                    l = max(1, int(parts[0].split()[-1]))
-                    w = max(1, int(parts[1].split()[0]))
-                except:
-                    l, w = 2, 2
-            _draw_part_thumb_topdown(d, (tx0,ty0,tx1,ty1), color, l, w)
+            tx0, ty0, tx1, ty1 = (cell[0]+6, cell[1]+4, cell[0]+6+THUMB_W, cell[1]+4+PLI_TH-8)
+            img.paste(_part_sprite(color, l, w), (tx0, ty0))
             # labels
             d.text((tx1+6, ty0+4), f"{ldraw}", fill=(40,40,40))
             d.text((tx1+6, ty0+24), f"{color} ×{qty}", fill=(40,40,40))
             row += 1
 
-    img.save(out_path)  # keep native size; PDF stays crisp
+    # keep native size so the PDF stays crisp; replace rather than rewrite the file,
+    # which may be a hard link into the session store
+    with atomic_open(out_path, "wb") as fh:
+        img.save(fh, format="PNG")
+
+# ===== Lazy pages =====
+# The pipeline stores placements per session; pages are rendered on first
+# request (see api GET /sessions/{id}/steps/{n}.png) and cached next to them.
+SESSION_MODEL = "placements.json"
+_page_locks: Dict[str, List] = {}   # out_path -> [lock, threads using it]
+_page_locks_guard = threading.Lock()
+
+def step_png_path(outdir: str, s: int) -> str:
+    return os.path.join(outdir, "instructions", "steps", f"step_{s:02d}.png")
+
+def save_session_model(placements: List[Dict], outdir: str, H: int, W: int, L: int, step_count: int) -> str:
+    path = os.path.join(outdir, SESSION_MODEL)
+    with atomic_open(path, "w", encoding="utf-8") as f:
+        json.dump({"H": H, "W": W, "L": L, "step_count": step_count, "placements": placements}, f)
+    return path
+
+@lru_cache(maxsize=16)
+def _load_session_model(path: str, mtime: float) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        model = json.load(f)
+    model["index"] = StepIndex(model.pop("placements"))
+    return model
+
+def load_session_model(outdir: str) -> Dict:
+    path = os.path.join(outdir, SESSION_MODEL)
+    return _load_session_model(path, os.path.getmtime(path))
+
+def render_step_page(outdir: str, s: int) -> str:
+    """Returns the PNG for step s, rendering and caching it on first access.
+    Raises IndexError for steps outside the model.
+    """
+    out_path = step_png_path(outdir, s)
+    if os.path.isfile(out_path):
+        return out_path
+    # check the range before taking a lock, so bad step numbers cannot grow _page_locks
+    model = load_session_model(outdir)
+    if not 0 <= s < model["step_count"]:
+        raise IndexError(f"step {s} out of range (0..{model['step_count']-1})")
+    # the entry lives while any thread holds or waits on the lock, so a late
+    # request always queues behind the render in progress
+    with _page_locks_guard:
+        entry = _page_locks.setdefault(out_path, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            if not os.path.isfile(out_path):
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                # draw_step_image writes then renames, so readers never see a partial PNG
+                index = model["index"]
+                draw_step_image(index.placements, s, model["W"], model["L"], out_path, index=index)
+    finally:
+        with _page_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _page_locks[out_path]
+    return out_path
 
 def write_instruction_set(
     placements: List[Dict],
@@ -158,20 +243,27 @@ def write_instruction_set(
     H: int, W: int, L: int,
     spec: Optional[dict] = None,
     pdf_path: Optional[str] = None,
-    step_count: Optional[int] = None
+    step_count: Optional[int] = None,
+    page_url: Optional[str] = None,
+    pdf_url: Optional[str] = None,
+    render: bool = True,
+    index: Optional[StepIndex] = None,
 ):
+    """Writes instructions.html and (with `render`) every step PNG.
+    `page_url` (e.g. "/sessions/<id>/steps/{n}.png") points the manual at the
+    lazy page endpoint instead of local files; `pdf_url` likewise for the PDF.
+    """
     steps_dir = os.path.join(outdir, "instructions", "steps")
     os.makedirs(steps_dir, exist_ok=True)
 
+    if index is None:
+        index = StepIndex(placements)
     if step_count is None:
-        step_count = 1 + max(int(p.get("step", 0)) for p in placements) if placements else 0
-
-    page_limit = min(step_count, MAX_PAGES)
-    placements = sorted(placements, key=lambda p: (int(p["step"]), p["y"], p["x"], p["ldraw"]))
+        step_count = index.step_count
 
-    for s in range(page_limit):
-        out_path = os.path.join(steps_dir, f"step_{s:02d}.png")
-        draw_step_image(placements, s, W, L, out_path)
+    if render:
+        for s in range(step_count):
+            draw_step_image(index.placements, s, W, L, step_png_path(outdir, s), index=index)
 
     # HTML
     css = """
@@ -181,23 +273,34 @@ def write_instruction_set(
     .card{border:1px solid #e6e6e6;border-radius:12px;padding:12px}
     img.step{width:100%;height:auto;border-radius:10px;border:1px solid #eee}
     .muted{color:#666}
+    .pli{font-size:13px;margin-top:8px}
     """
     html = [ "<html><head><meta charset='utf-8'><title>LEGO Instructions</title>",
              f"<style>{css}</style></head><body>" ]
     html.append("<h1>Build Instructions</h1>")
     if spec:
         html.append(f"<div>Style: <b>{spec.get('style','')}</b> — Size: <b>{spec.get('length_studs','?')}×{spec.get('width_studs','?')}</b> studs — Height: <b>{spec.get('height_layers','?')}</b> layers</div>")
-    if pdf_path and os.path.isfile(pdf_path):
+    if pdf_url:
+        html.append(f"<a class='btn' href='{pdf_url}' download>Download PDF</a>")
+    elif pdf_path and os.path.isfile(pdf_path):
         html.append(f"<a class='btn' href='{os.path.relpath(pdf_path, outdir)}' download>Download PDF</a>")
-    if page_limit < step_count:
-        html.append(f"<div class='muted'>Showing first {page_limit} of {step_count} steps (capped).</div>")
+    html.append(f"<div class='muted'>{step_count} steps</div>")
     html.append("<div class='grid'>")
-    for s in range(page_limit):
-        step_png = os.path.join("instructions", "steps", f"step_{s:02d}.png")
+    for s in range(step_count):
+        if page_url:
+            step_png = page_url.format(n=s)
+        else:
+            step_png = os.path.join("instructions", "steps", f"step_{s:02d}.png")
         html.append("<div class='card'>")
         html.append(f"<h3>Step {s}</h3>")
-        html.append(f"<img class='step' src='{step_png}' alt='Step {s}'>")
+        html.append(f"<img class='step' src='{step_png}' alt='Step {s}' loading='lazy'>")
+        if s < index.step_count:
+            # per-step and running-total BOM straight from the step index
+            this_step = ", ".join(f"{it['part_id']} {it['color']} ×{it['quantity']}" for it in index.bom(step=s))
+            total = int(index.cumulative[s].sum())
+            html.append(f"<div class='pli'>{this_step}</div>")
+            html.append(f"<div class='pli muted'>{total} of {int(index.totals.sum())} parts placed</div>")
         html.append("</div>")
     html.append("</div></body></html>")
-    with open(os.path.join(outdir, "instructions.html"), "w", encoding="utf-8") as f:
+    with atomic_open(os.path.join(outdir, "instructions.html"), "w", encoding="utf-8") as f:
         f.write("\n".join(html))
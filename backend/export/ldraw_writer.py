@@ -1,7 +1,10 @@
 # backend/export/ldraw_writer.py
-from typing import List, Dict
+from typing import List, Dict, Optional
 from collections import defaultdict
 import os
+from ..optimize.parts import ROTATIONS
+from ..planners.step_index import StepIndex
+from ..utils.fileio import atomic_open
 
 LDRAW_COLOR = {"red": 4, "black": 0, "light_gray": 7, "white": 15, "blue": 1, "green": 2, "yellow": 14}
 STUD = 20
@@ -13,9 +16,10 @@ def _part_line(p: Dict) -> str:
     Y = int(z * PLATE)
     Z = int((p["y"] + p["w"] / 2.0) * STUD)
     col = LDRAW_COLOR.get(p["color"], 7)
-    return f"1 {col} {X} {Y} {Z}  1 0 0  0 1 0  0 0 1 {p['ldraw']}"
+    rot = ROTATIONS[int(p.get("rot", 0))]
+    return f"1 {col} {X} {Y} {Z}  {rot} {p['ldraw']}"
 
-def write_assembly(placements: List[Dict], outdir: str, H: int) -> str:
+def write_assembly(placements: List[Dict], outdir: str, H: int, index: Optional[StepIndex] = None) -> str:
     """
     Writes:
       step_00.ldr, step_01.ldr, ...
@@ -24,32 +28,34 @@ def write_assembly(placements: List[Dict], outdir: str, H: int) -> str:
     """
     os.makedirs(outdir, exist_ok=True)
     if any("step" in p for p in placements):
-        key = "step"
-        steps = sorted(set(int(p["step"]) for p in placements))
+        # step slices come pre-sorted by (y, x, ldraw) from the step index
+        if index is None:
+            index = StepIndex(placements)
+        steps = index.steps()
         label = "step"
+        bucket = index.step
     else:
-        key = "z"
         steps = list(range(H))
         label = "layer"
-
-    buckets = defaultdict(list)
-    for p in placements:
-        buckets[int(p.get(key, 0))].append(p)
+        buckets = defaultdict(list)
+        for p in placements:
+            buckets[int(p.get("z", 0))].append(p)
+        bucket = lambda s: sorted(buckets[s], key=lambda q: (q["y"], q["x"], q["ldraw"]))
 
     # write subfiles
     subfiles = []
     for s in steps:
         path = os.path.join(outdir, f"{label}_{s:02d}.ldr")
-        with open(path, "w", encoding="utf-8", newline="\r\n") as fh:
+        with atomic_open(path, "w", encoding="utf-8", newline="\r\n") as fh:
             fh.write(f"0 FILE {label}_{s:02d}.ldr\n")
             fh.write(f"0 // Generated submodel for {label} {s}\n")
-            for p in sorted(buckets[s], key=lambda q: (q["y"], q["x"], q["ldraw"])):
+            for p in bucket(s):
                 fh.write(_part_line(p) + "\n")
         subfiles.append(path)
 
     # top-level
     model_path = os.path.join(outdir, "model.ldr")
-    with open(model_path, "w", encoding="utf-8", newline="\r\n") as fh:
+    with atomic_open(model_path, "w", encoding="utf-8", newline="\r\n") as fh:
         fh.write("0 FILE model.ldr\n")
         fh.write(f"0 // Main assembly: each {label} as a STEP\n")
         first = True
@@ -20,15 +20,18 @@ def _resolve_ldraw_dir() -> str | None:
     d = os.path.join(os.getenv("LOCALAPPDATA", ""), "LPub3D Software", "LDraw")
     return d if os.path.isdir(d) else None
 
-def make_pdf(model_path: str, outdir: str, timeout_s: int = 45) -> str | None:
-    os.makedirs(outdir, exist_ok=True)
-    pdf_path = os.path.join(outdir, "instructions.pdf")
+def build_command(model_path: str, pdf_path: str) -> list[str]:
     exe = _resolve_lpub3d_exe()
     ldraw_dir = _resolve_ldraw_dir()
-
     cmd = [exe, os.path.abspath(model_path), "-o", os.path.abspath(pdf_path)]
     if ldraw_dir:
         cmd.extend(["-l", os.path.abspath(ldraw_dir)])
+    return cmd
+
+def make_pdf(model_path: str, outdir: str, timeout_s: int = 45) -> str | None:
+    os.makedirs(outdir, exist_ok=True)
+    pdf_path = os.path.join(outdir, "instructions.pdf")
+    cmd = build_command(model_path, pdf_path)
 
     print("LPub3D command:", cmd)
     try:
@@ -0,0 +1,174 @@
+# backend/export/lpub_runner.py
+"""Shared LPub3D rendering service for the API.
+
+At most LPUB3D_CONCURRENCY renderer processes run at once; further requests wait
+on an asyncio semaphore (up to LPUB3D_MAX_QUEUE waiters, beyond that they are
+rejected). Results are cached by a hash of the model and its step subfiles, and
+identical models requested concurrently share one render.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Dict, Optional
+
+from .lpub_pdf import build_command
+from ..utils.fileio import link_or_copy
+
+_SUBFILE_REF = re.compile(r"^1\s+(?:\S+\s+){13}(\S+\.ldr)\s*$", re.IGNORECASE)
+
+def model_hash(model_path: str) -> str:
+    """sha256 over the top-level .ldr plus the local subfiles it references."""
+    h = hashlib.sha256()
+    base = os.path.dirname(model_path)
+    with open(model_path, "rb") as fh:
+        top = fh.read()
+    h.update(top)
+    for line in top.decode("utf-8", "replace").splitlines():
+        m = _SUBFILE_REF.match(line.strip())
+        if not m:
+            continue
+        sub = os.path.join(base, m.group(1))
+        if os.path.isfile(sub):
+            h.update(m.group(1).encode())
+            with open(sub, "rb") as fh:
+                h.update(fh.read())
+    return h.hexdigest()
+
+def _copy_if_cached(cached: str, out_path: str) -> bool:
+    if not os.path.isfile(cached):
+        return False
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    try:
+        os.utime(cached)   # the session store evicts cache entries least recently used first
+        link_or_copy(cached, out_path)
+    except FileNotFoundError:
+        return False   # evicted between the check and the copy
+    return True
+
+class LPubRunner:
+    def __init__(self, max_concurrency: int = 2, timeout_s: float = 45.0,
+                 max_queue: int = 32, cache_dir: str = os.path.join("outputs", ".lpub_cache")):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout_s = timeout_s
+        self.max_queue = max_queue
+        self.cache_dir = cache_dir
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "queued": 0, "running": 0, "completed": 0, "failed": 0,
+            "timeouts": 0, "rejected": 0, "cache_hits": 0, "render_seconds": 0.0,
+        }
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # semaphores bind to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._loop is not loop:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+            self._inflight.clear()
+        return self._sem
+
+    def metrics(self) -> Dict:
+        return {
+            **self.stats,
+            "render_seconds": round(self.stats["render_seconds"], 3),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "inflight_models": len(self._inflight),
+        }
+
+    async def render(self, model_path: str, outdir: str, pdf_name: str = "instructions_lpub3d.pdf") -> Optional[str]:
+        """Renders model_path to <outdir>/<pdf_name>; returns the path, or None if
+        LPub3D is unavailable, the queue is full, or the render failed.
+        """
+        sem = self._semaphore()
+        # hashing and copying are file I/O: keep them off the event loop
+        key = await asyncio.to_thread(model_hash, model_path)
+        out_path = os.path.join(outdir, pdf_name)
+        cached = os.path.join(self.cache_dir, f"{key}.pdf")
+
+        if await asyncio.to_thread(_copy_if_cached, cached, out_path):
+            self.stats["cache_hits"] += 1
+            return out_path
+
+        fut = self._inflight.get(key)
+        if fut is None:
+            if self.stats["queued"] >= self.max_queue:
+                self.stats["rejected"] += 1
+                print(f"[WARN] LPub3D queue full ({self.stats['queued']} waiting) — skipping.")
+                return None
+            fut = asyncio.ensure_future(self._render_to_cache(sem, model_path, cached))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _f, k=key: self._inflight.pop(k, None))
+        else:
+            self.stats["cache_hits"] += 1
+
+        ok = await asyncio.shield(fut)
+        if not ok:
+            return None
+        if not await asyncio.to_thread(_copy_if_cached, cached, out_path):
+            return None   # evicted from the cache in the meantime
+        return out_path
+
+    async def _render_to_cache(self, sem: asyncio.Semaphore, model_path: str, cached: str) -> bool:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_pdf = f"{cached}.{os.getpid()}.{id(self)}.tmp.pdf"
+        try:
+            cmd = build_command(model_path, tmp_pdf)
+        except FileNotFoundError as e:
+            print("LPub3D PDF generation failed:", e)
+            self.stats["failed"] += 1
+            return False
+
+        self.stats["queued"] += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.stats["queued"] -= 1
+        self.stats["running"] += 1
+        t0 = time.time()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, err = await asyncio.wait_for(proc.communicate(), timeout=self.timeout_s)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                self.stats["timeouts"] += 1
+                print(f"LPub3D timed out after {self.timeout_s}s — skipping.")
+                return False
+            if proc.returncode != 0 or not os.path.isfile(tmp_pdf):
+                self.stats["failed"] += 1
+                print(f"LPub3D PDF generation failed (exit {proc.returncode}):", err.decode("utf-8", "replace")[-500:])
+                return False
+            os.replace(tmp_pdf, cached)
+            self.stats["completed"] += 1
+            return True
+        except OSError as e:
+            self.stats["failed"] += 1
+            print("LPub3D PDF generation failed:", e)
+            return False
+        finally:
+            self.stats["running"] -= 1
+            self.stats["render_seconds"] += time.time() - t0
+            sem.release()
+            if os.path.exists(tmp_pdf):
+                os.remove(tmp_pdf)
+
+_runner: Optional[LPubRunner] = None
+
+def get_runner() -> LPubRunner:
+    global _runner
+    if _runner is None:
+        _runner = LPubRunner(
+            max_concurrency=int(os.getenv("LPUB3D_CONCURRENCY", "2")),
+            timeout_s=float(os.getenv("LPUB3D_TIMEOUT", "45")),
+            max_queue=int(os.getenv("LPUB3D_MAX_QUEUE", "32")),
+            cache_dir=os.getenv("LPUB3D_CACHE_DIR", os.path.join("outputs", ".lpub_cache")),
+        )
+    return _runner
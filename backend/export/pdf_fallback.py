@@ -1,16 +1,22 @@
 # backend/export/pdf_fallback.py
 import os
+import re
 from typing import Optional
-from PIL import Image
+
+def _step_no(path: str) -> int:
+    # step_7.png / step_07.png / step_123.png — numeric, not lexicographic, order
+    m = re.search(r"step_(\d+)", os.path.basename(path))
+    return int(m.group(1)) if m else -1
 
 def make_pdf_from_pngs(outdir: str, pdf_name: str = "instructions.pdf") -> Optional[str]:
     steps_dir = os.path.join(outdir, "instructions", "steps")
     candidates = []
     if os.path.isdir(steps_dir):
         candidates = sorted(
-            os.path.join(steps_dir, f)
-            for f in os.listdir(steps_dir)
-            if f.lower().endswith(".png") and f.startswith("step_")
+            (os.path.join(steps_dir, f)
+             for f in os.listdir(steps_dir)
+             if f.lower().endswith(".png") and f.startswith("step_")),
+            key=_step_no,
         )
     if not candidates:
         # fallback to any older pattern if present
@@ -24,7 +30,13 @@ def make_pdf_from_pngs(outdir: str, pdf_name: str = "instructions.pdf") -> Optio
     if not candidates:
         return None
 
+    from PIL import Image   # imported on first use; keeps server start light
     images = [Image.open(p).convert("RGB") for p in candidates]
     pdf_path = os.path.join(outdir, pdf_name)
-    images[0].save(pdf_path, save_all=True, append_images=images[1:])
+    tmp = f"{pdf_path}.{os.getpid()}.tmp"
+    # no timestamps and a fixed title (not the temp name), so identical manuals are
+    # byte-identical and share one copy in the session store
+    images[0].save(tmp, format="PDF", save_all=True, append_images=images[1:],
+                   title=os.path.splitext(pdf_name)[0], creationDate=None, modDate=None)
+    os.replace(tmp, pdf_path)
     return pdf_path if os.path.isfile(pdf_path) else None
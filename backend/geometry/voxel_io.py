@@ -0,0 +1,191 @@
+# backend/geometry/voxel_io.py
+"""Load pre-built voxel grids from disk without materializing dense copies.
+
+Supported inputs (all indexed [z,y,x], z = layer, nonzero == occupied):
+  .npy   any integer/bool 3-D array; memory-mapped
+  .npz   a single 3-D array (or one named "voxels"); memory-mapped when stored
+         uncompressed, loaded otherwise
+  .npz   bitpacked: arrays "packed" = np.packbits(grid, axis=-1) and "shape";
+         layers are unpacked one at a time
+  .vox   MagicaVoxel (first model); kept sparse and rasterized per layer
+
+Loaders return an object with `.shape` whose `[z]` yields a 2-D [y,x] layer,
+which is all the packers need (see `layer_mask`).
+"""
+import os
+import struct
+import zipfile
+from typing import Optional, Tuple
+
+import numpy as np
+
+MAX_DIM = 256   # per axis
+FORMATS = ("npy", "npz", "vox")
+
+def layer_mask(vox, z: int) -> np.ndarray:
+    """Layer z of any voxel source as a uint8 0/1 [y,x] array."""
+    layer = np.asarray(vox[z])
+    if layer.dtype == np.uint8 and layer.max(initial=0) <= 1:
+        return layer
+    return (layer != 0).astype(np.uint8)
+
+def count_occupied(vox) -> int:
+    if isinstance(vox, np.ndarray) and not isinstance(vox, np.memmap):
+        return int(np.count_nonzero(vox))
+    return sum(int(np.count_nonzero(vox[z])) for z in range(vox.shape[0]))
+
+def validate_shape(shape: Tuple[int, ...]) -> Tuple[int, int, int]:
+    if len(shape) != 3:
+        raise ValueError(f"voxel grid must be 3-D [z,y,x], got shape {tuple(shape)}")
+    for n in shape:
+        if not 1 <= int(n) <= MAX_DIM:
+            raise ValueError(f"voxel grid dims must be within 1..{MAX_DIM}, got {tuple(shape)}")
+    return tuple(int(n) for n in shape)
+
+def _validate_dtype(dtype: np.dtype):
+    if dtype.kind not in "biu":
+        raise ValueError(f"voxel grid must be bool or integer, got dtype {dtype}")
+
+class PackedVoxels:
+    """Bitpacked grid (np.packbits along x); unpacks one layer per access."""
+    def __init__(self, packed: np.ndarray, shape: Tuple[int, int, int]):
+        Z, W, L = shape
+        if packed.shape != (Z, W, (L + 7) // 8):
+            raise ValueError(f"packed array {packed.shape} does not match shape {shape}")
+        self.packed = packed
+        self.shape = shape
+
+    def __getitem__(self, z: int) -> np.ndarray:
+        return np.unpackbits(self.packed[z], axis=-1, count=self.shape[2])
+
+class SparseVoxels:
+    """Occupied (x,y,z) coordinates bucketed by layer; rasterizes one layer per access."""
+    def __init__(self, xyz: np.ndarray, shape: Tuple[int, int, int]):
+        self.shape = shape
+        z = xyz[:, 2].astype(np.int64)
+        order = np.argsort(z, kind="stable")
+        self._xy = xyz[order, :2].astype(np.intp)
+        self._starts = np.searchsorted(z[order], np.arange(shape[0] + 1))
+
+    def __getitem__(self, z: int) -> np.ndarray:
+        out = np.zeros(self.shape[1:], dtype=np.uint8)
+        xy = self._xy[self._starts[z]:self._starts[z + 1]]
+        out[xy[:, 1], xy[:, 0]] = 1
+        return out
+
+def _memmap_npz_member(path: str, zf: zipfile.ZipFile, name: str):
+    """Memory-map an uncompressed .npy member of a .npz in place; None if not possible."""
+    info = zf.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(path, "rb") as fh:
+        fh.seek(info.header_offset)
+        local = fh.read(30)
+        if local[:4] != b"PK\x03\x04":
+            return None
+        name_len, extra_len = struct.unpack("<HH", local[26:30])
+        fh.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(fh)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+        offset = fh.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape,
+                     order="F" if fortran else "C")
+
+def _load_npz(path: str):
+    with zipfile.ZipFile(path) as zf:
+        members = [n for n in zf.namelist() if n.endswith(".npy")]
+
+        def member(key: str):
+            name = key + ".npy"
+            arr = _memmap_npz_member(path, zf, name)
+            if arr is None:
+                # compressed member: one dense copy is unavoidable
+                with zf.open(name) as fh:
+                    arr = np.lib.format.read_array(fh)
+            return arr
+
+        keys = [n[:-4] for n in members]
+        if "packed" in keys:
+            shape = validate_shape(tuple(int(n) for n in np.asarray(member("shape")).ravel()))
+            packed = member("packed")
+            if packed.dtype != np.uint8:
+                raise ValueError(f"packed array must be uint8, got {packed.dtype}")
+            return PackedVoxels(packed, shape)
+        if "voxels" in keys:
+            arr = member("voxels")
+        elif len(keys) == 1:
+            arr = member(keys[0])
+        else:
+            raise ValueError(f"ambiguous .npz: expected one array, 'voxels', or 'packed'+'shape'; got {keys}")
+    validate_shape(arr.shape)
+    _validate_dtype(arr.dtype)
+    return arr
+
+def _load_vox(path: str) -> SparseVoxels:
+    with open(path, "rb") as fh:
+        head = fh.read(8)
+        if head[:4] != b"VOX ":
+            raise ValueError("not a MagicaVoxel .vox file")
+        size = None
+        pos = 8
+        file_len = os.path.getsize(path)
+        while pos + 12 <= file_len:
+            fh.seek(pos)
+            cid, content, children = struct.unpack("<4sii", fh.read(12))
+            if content < 0 or children < 0:
+                raise ValueError(f".vox chunk {cid!r} has a negative size")
+            body = pos + 12
+            if cid == b"MAIN":
+                pos = body + content  # descend into children
+                continue
+            if cid == b"SIZE":
+                fh.seek(body)
+                size = struct.unpack("<iii", fh.read(12))  # x, y, z (z up)
+            elif cid == b"XYZI":
+                if size is None:
+                    raise ValueError(".vox XYZI chunk before SIZE")
+                fh.seek(body)
+                (n,) = struct.unpack("<i", fh.read(4))
+                sx, sy, sz = size
+                shape = validate_shape((sz, sy, sx))
+                xyzi = np.memmap(path, dtype=np.uint8, mode="r", offset=body + 4, shape=(n, 4))
+                xyz = np.asarray(xyzi[:, :3])
+                if n and (xyz.max(axis=0) >= np.array([sx, sy, sz])).any():
+                    raise ValueError(".vox voxel coordinates exceed model SIZE")
+                return SparseVoxels(xyz, shape)
+            pos = body + content + children
+    raise ValueError(".vox file has no model data")
+
+def detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    if ext not in FORMATS:
+        raise ValueError(f"unsupported voxel file extension {ext!r}; expected one of {FORMATS}")
+    return ext
+
+# what a corrupt or truncated file raises from numpy / zipfile / struct
+_PARSE_ERRORS = (zipfile.BadZipFile, KeyError, IndexError, EOFError, struct.error)
+
+def _load(path: str, fmt: str):
+    if fmt == "npy":
+        arr = np.load(path, mmap_mode="r", allow_pickle=False)
+        validate_shape(arr.shape)
+        _validate_dtype(arr.dtype)
+        return arr
+    if fmt == "npz":
+        return _load_npz(path)
+    if fmt == "vox":
+        return _load_vox(path)
+    raise ValueError(f"unsupported voxel format {fmt!r}; expected one of {FORMATS}")
+
+def load_voxels(path: str, fmt: Optional[str] = None):
+    """Raises ValueError for any file that cannot be read as a voxel grid."""
+    fmt = fmt or detect_format(path)
+    try:
+        return _load(path, fmt)
+    except _PARSE_ERRORS as e:
+        raise ValueError(f"invalid .{fmt} voxel file ({type(e).__name__}: {e})") from e
@@ -1,62 +1,82 @@
 from typing import List, Tuple, Dict
 import numpy as np
 import random
+from ..geometry.voxel_io import layer_mask
+from .parts import DEFAULT_CATALOG, footprints, summed_area, window_sums
 
-# Define plate parts with sizes (studs) and LDraw part IDs
-PARTS = [
-    {"name":"Plate 2x4", "w":2, "l":4, "ldraw":"3020.dat"},
-    {"name":"Plate 2x2", "w":2, "l":2, "ldraw":"3022.dat"},
-    {"name":"Plate 1x2", "w":1, "l":2, "ldraw":"3023.dat"},
-    {"name":"Plate 1x1", "w":1, "l":1, "ldraw":"3024.dat"},
-]
-
-def pack_greedy(vox: np.ndarray, seed: int = 42) -> List[Dict]:
-    """Greedy layer-by-layer packing with plates. 
-    vox shape: [z,y,x] occupied==1
-    Returns list of parts dict: {z,y,x,w,l,name,ldraw,color}
+def pack_greedy(vox: np.ndarray, seed: int = 42, catalog: str = DEFAULT_CATALOG) -> List[Dict]:
+    """Greedy layer-by-layer packing, largest parts first (see parts.footprints).
+    vox shape: [z,y,x] occupied!=0; any source whose [z] yields a layer works
+    (ndarray, memmap, voxel_io.PackedVoxels), only a few layers are held at a time.
+    Returns list of parts dict: {z,y,x,w,l,h,rot,name,ldraw,color}
     """
     rng = random.Random(seed)
     H, W, L = vox.shape
-    # Start with all zeros for coverage tracking
-    covered = np.zeros_like(vox, dtype=np.uint8)
+    parts = footprints(catalog)
+    max_h = max(p["h"] for p in parts)
     placements = []
 
+    # rolling windows over the layers a part starting at z can touch
+    layers: Dict[int, np.ndarray] = {}
+    covered: Dict[int, np.ndarray] = {}
+
     # simple palette rotation
     palette_cycle = ["red","black","light_gray","white","blue","green","yellow"]
 
     for z in range(H):
-        # ensure support: restrict to positions where below is base or already covered
-        support = (z == 0) or (covered[z-1] == 1)
-
-        # Try to place largest plates first
-        for part in PARTS:
-            w, l = part["w"], part["l"]
-            for y in range(W - w + 1):
-                for x in range(L - l + 1):
-                    # check if area needs coverage and is supported
-                    region = vox[z, y:y+w, x:x+l]
-                    if region.sum() == w*l and (z==0 or covered[z-1, y:y+w, x:x+l].sum() >= int(0.5*w*l)):
-                        # ensure not already covered
-                        if covered[z, y:y+w, x:x+l].sum() == 0:
-                            # place it
-                            placements.append({
-                                "z": z, "y": y, "x": x, "w": w, "l": l,
-                                "name": part["name"], "ldraw": part["ldraw"],
-                                "color": palette_cycle[(z + y + x) % len(palette_cycle)]
-                            })
-                            covered[z, y:y+w, x:x+l] = 1
+        for zz in range(z, min(H, z + max_h)):
+            if zz not in layers:
+                layers[zz] = layer_mask(vox, zz)
+                covered[zz] = np.zeros((W, L), dtype=np.uint8)
+        for zz in [k for k in layers if k < z - 1]:
+            del layers[zz], covered[zz]
+        covered_below = covered.get(z - 1)
+
+        # one summed-area pass per part height (free & occupied through all its
+        # layers) plus one for support; every footprint reuses them
+        free_sat = {}
+        for h in sorted({p["h"] for p in parts}):
+            if z + h > H:
+                continue
+            free = np.ones((W, L), dtype=bool)
+            for zz in range(z, z + h):
+                free &= (layers[zz] == 1) & (covered[zz] == 0)
+            free_sat[h] = summed_area(free)
+        support_sat = summed_area(covered_below) if covered_below is not None else None
+
+        # Try to place largest parts first
+        for part in parts:
+            w, l, h = part["w"], part["l"], part["h"]
+            if h not in free_sat:
+                continue
+            ok = window_sums(free_sat[h], w, l) == w*l
+            if support_sat is not None:
+                # require at least 50% overlap with covered studs below
+                ok &= window_sums(support_sat, w, l) >= int(0.5*w*l)
+            for y, x in np.argwhere(ok):
+                y, x = int(y), int(x)
+                # ensure not covered by a part placed earlier in this pass
+                if any(covered[zz][y:y+w, x:x+l].any() for zz in range(z, z + h)):
+                    continue
+                placements.append({
+                    "z": z, "y": y, "x": x, "w": w, "l": l, "h": h, "rot": part["rot"],
+                    "name": part["name"], "ldraw": part["ldraw"],
+                    "color": palette_cycle[(z + y + x) % len(palette_cycle)]
+                })
+                for zz in range(z, z + h):
+                    covered[zz][y:y+w, x:x+l] = 1
 
         # Fill any uncovered but occupied voxels with 1x1
-        for y in range(W):
-            for x in range(L):
-                if vox[z,y,x] == 1 and covered[z,y,x] == 0:
-                    # check support
-                    if z==0 or covered[z-1,y,x]==1:
-                        placements.append({
-                            "z": z, "y": y, "x": x, "w": 1, "l": 1,
-                            "name": "Plate 1x1", "ldraw": "3024.dat",
-                            "color": palette_cycle[(z + y + x) % len(palette_cycle)]
-                        })
-                        covered[z,y,x] = 1
+        todo = (layers[z] == 1) & (covered[z] == 0)
+        if covered_below is not None:
+            todo &= covered_below == 1
+        for y, x in np.argwhere(todo):
+            y, x = int(y), int(x)
+            placements.append({
+                "z": z, "y": y, "x": x, "w": 1, "l": 1, "h": 1, "rot": 0,
+                "name": "Plate 1x1", "ldraw": "3024.dat",
+                "color": palette_cycle[(z + y + x) % len(palette_cycle)]
+            })
+            covered[z][y, x] = 1
 
     return placements
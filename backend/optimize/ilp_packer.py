@@ -2,60 +2,55 @@
 from typing import List, Dict, Tuple
 import numpy as np
 from ortools.sat.python import cp_model
-
-# same parts as greedy packer
-PARTS = [
-    {"name":"Plate 2x4", "w":2, "l":4, "ldraw":"3020.dat"},
-    {"name":"Plate 2x2", "w":2, "l":2, "ldraw":"3022.dat"},
-    {"name":"Plate 1x2", "w":1, "l":2, "ldraw":"3023.dat"},
-    {"name":"Plate 1x1", "w":1, "l":1, "ldraw":"3024.dat"},
-]
+from ..geometry.voxel_io import layer_mask
+from .parts import DEFAULT_CATALOG, footprints, summed_area, window_sums
 
 PALETTE = ["red","black","light_gray","white"]
 
-def _candidates_for_layer(layer: np.ndarray, below: np.ndarray | None) -> Tuple[List[Dict], Dict[Tuple[int,int], List[int]]]:
-    H, W, L = 1, layer.shape[0], layer.shape[1]  # layer is [y,x]
+def _candidates_for_layer(layer: np.ndarray, below: np.ndarray | None, parts: List[Dict]) -> Tuple[List[Dict], Dict[Tuple[int,int], List[int]]]:
+    W, L = layer.shape  # layer is [y,x]
     cands: List[Dict] = []
     cover: Dict[Tuple[int,int], List[int]] = {}
-    z = 0  # single layer function
 
-    def supported(y0, x0, w, l) -> bool:
-        if below is None:
-            return True
-        # require at least 50% overlap with covered below
-        return below[y0:y0+w, x0:x0+l].sum() >= (w*l)//2
+    # shared summed-area tables: every footprint's window test is a few slices
+    full_sat = summed_area(layer)
+    below_sat = summed_area(below) if below is not None else None
 
     idx = 0
-    for part in PARTS:
+    for part in parts:
         w,l = part["w"], part["l"]
-        for y in range(W - w + 1):
-            for x in range(L - l + 1):
-                region = layer[y:y+w, x:x+l]
-                if region.sum() == w*l and supported(y,x,w,l):
-                    cands.append({
-                        "z": None, "y": y, "x": x, "w": w, "l": l,
-                        "name": part["name"], "ldraw": part["ldraw"],
-                    })
-                    for yy in range(y, y+w):
-                        for xx in range(x, x+l):
-                            cover.setdefault((yy,xx), []).append(idx)
-                    idx += 1
+        ok = window_sums(full_sat, w, l) == w*l
+        if below_sat is not None:
+            # require at least 50% overlap with covered below
+            ok &= window_sums(below_sat, w, l) >= (w*l)//2
+        for y, x in np.argwhere(ok):
+            y, x = int(y), int(x)
+            cands.append({
+                "z": None, "y": y, "x": x, "w": w, "l": l, "h": 1, "rot": part["rot"],
+                "name": part["name"], "ldraw": part["ldraw"],
+            })
+            for yy in range(y, y+w):
+                for xx in range(x, x+l):
+                    cover.setdefault((yy,xx), []).append(idx)
+            idx += 1
     return cands, cover
 
-def pack_ilp(vox: np.ndarray, seed: int = 42) -> List[Dict]:
-    # vox: [z,y,x] with 1 for occupied
+def pack_ilp(vox: np.ndarray, seed: int = 42, catalog: str = DEFAULT_CATALOG) -> List[Dict]:
+    # vox: [z,y,x] with nonzero for occupied; layers are read one at a time
+    # the per-layer model only places plates; bricks in the catalog are skipped
+    parts = [p for p in footprints(catalog) if p["h"] == 1]
     Z, W, L = vox.shape
     placements: List[Dict] = []
     covered_below = None
 
     for z in range(Z):
-        layer = vox[z]
+        layer = layer_mask(vox, z)
         if covered_below is None:
             below_mask = None
         else:
             below_mask = covered_below
 
-        cands, cover = _candidates_for_layer(layer, below_mask)
+        cands, cover = _candidates_for_layer(layer, below_mask, parts)
         model = cp_model.CpModel()
         xs = [model.NewBoolVar(f"x_{i}") for i in range(len(cands))]
 
@@ -88,7 +83,7 @@ def pack_ilp(vox: np.ndarray, seed: int = 42) -> List[Dict]:
             for x in range(L):
                 if layer[y,x] == 1 and covered[y,x] == 0:
                     placements.append({
-                        "z": z, "y": y, "x": x, "w": 1, "l": 1,
+                        "z": z, "y": y, "x": x, "w": 1, "l": 1, "h": 1, "rot": 0,
                         "name": "Plate 1x1", "ldraw": "3024.dat",
                         "color": PALETTE[(z + y + x) % len(PALETTE)]
                     })
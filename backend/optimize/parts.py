@@ -0,0 +1,93 @@
+# backend/optimize/parts.py
+"""Data-driven part catalog shared by the packers and exporters.
+
+Sizes are in studs (w along y, l along x) and plate layers (h: 1 = plate,
+3 = brick). In the canonical orientation (rot=0) the part's long side runs along
+x, which is also LDraw's X axis for these parts; rot=90 swaps the footprint and
+maps to a 90° turn about LDraw's vertical axis.
+"""
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# name, LDraw id, w, l, h
+_PARTS = [
+    ("Plate 1x1", "3024.dat", 1, 1, 1),
+    ("Plate 1x2", "3023.dat", 1, 2, 1),
+    ("Plate 1x3", "3623.dat", 1, 3, 1),
+    ("Plate 1x4", "3710.dat", 1, 4, 1),
+    ("Plate 1x6", "3666.dat", 1, 6, 1),
+    ("Plate 2x2", "3022.dat", 2, 2, 1),
+    ("Plate 2x3", "3021.dat", 2, 3, 1),
+    ("Plate 2x4", "3020.dat", 2, 4, 1),
+    ("Plate 2x6", "3795.dat", 2, 6, 1),
+    ("Plate 4x4", "3031.dat", 4, 4, 1),
+    ("Brick 1x1", "3005.dat", 1, 1, 3),
+    ("Brick 1x2", "3004.dat", 1, 2, 3),
+    ("Brick 1x4", "3010.dat", 1, 4, 3),
+    ("Brick 1x6", "3009.dat", 1, 6, 3),
+    ("Brick 2x2", "3003.dat", 2, 2, 3),
+    ("Brick 2x3", "3002.dat", 2, 3, 3),
+    ("Brick 2x4", "3001.dat", 2, 4, 3),
+]
+
+# the original four-plate library, kept as a baseline for comparisons
+BASIC = ["3020.dat", "3022.dat", "3023.dat", "3024.dat"]
+
+CATALOGS = ("basic", "plates", "full")
+# "basic" packs exactly as before the catalog existed; "plates" and "full" are opt-in
+DEFAULT_CATALOG = "basic"
+
+# LDraw 3x3 rotation (row-major a b c d e f g h i) per orientation
+ROTATIONS = {
+    0:  "1 0 0  0 1 0  0 0 1",
+    90: "0 0 -1  0 1 0  1 0 0",
+}
+
+PART_BY_LDRAW: Dict[str, Dict] = {
+    ld: {"name": name, "ldraw": ld, "w": w, "l": l, "h": h} for name, ld, w, l, h in _PARTS
+}
+
+def short_label(name: str) -> str:
+    """Short part label for drawings, e.g. "Plate 2x4" -> "2x4"."""
+    return name.split(" ", 1)[1] if " " in name else name
+
+@lru_cache(maxsize=None)
+def _footprints(catalog: str) -> Tuple[Dict, ...]:
+    if catalog not in CATALOGS:
+        raise ValueError(f"unknown part catalog {catalog!r}; expected one of {CATALOGS}")
+    out = []
+    for name, ld, w, l, h in _PARTS:
+        if catalog == "basic" and ld not in BASIC:
+            continue
+        if catalog == "plates" and h != 1:
+            continue
+        out.append({"name": name, "ldraw": ld, "w": w, "l": l, "h": h, "rot": 0})
+        if catalog != "basic" and w != l:
+            out.append({"name": name, "ldraw": ld, "w": l, "l": w, "h": h, "rot": 90})
+    out.sort(key=lambda p: (-p["w"] * p["l"] * p["h"], p["h"], -p["w"] * p["l"], p["rot"]))
+    return tuple(out)
+
+def footprints(catalog: str = DEFAULT_CATALOG) -> List[Dict]:
+    """Placeable orientations, largest volume first (ties: flatter, then wider
+    footprint, then canonical before rotated). "basic" is the original
+    four-plate library without rotations. Built once per catalog; the dicts are
+    shared, so treat them as read-only.
+    """
+    return list(_footprints(catalog))
+
+def summed_area(mask: np.ndarray) -> np.ndarray:
+    """Summed-area table with a zero border: S[y, x] = mask[:y, :x].sum()."""
+    S = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(mask, axis=0, dtype=np.int32), axis=1, out=S[1:, 1:])
+    return S
+
+def window_sums(S: np.ndarray, w: int, l: int) -> np.ndarray:
+    """Sum of every w×l window from a summed-area table; shape (W-w+1, L-l+1)
+    (empty when the footprint does not fit).
+    """
+    W, L = S.shape[0] - 1, S.shape[1] - 1
+    if w > W or l > L:
+        return np.zeros((0, 0), dtype=S.dtype)
+    return S[w:, l:] - S[:W + 1 - w, l:] - S[w:, :L + 1 - l] + S[:W + 1 - w, :L + 1 - l]
@@ -0,0 +1,239 @@
+# backend/pipeline.py
+import os
+import time
+import uuid
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from .utils.spec_schema import DesignSpec
+from .utils.profiling import StageProfiler
+from .geometry.voxelizer import make_voxels
+from .geometry.voxel_io import count_occupied, load_voxels
+from .optimize.greedy_packer import pack_greedy
+from .optimize.parts import DEFAULT_CATALOG
+from .export.ldraw_writer import write_assembly
+from .export.bom import make_bom, write_bom
+from .export.instructions import save_session_model, write_instruction_set
+from .export.pdf_fallback import make_pdf_from_pngs
+from .planners.step_planner import plan_steps_connectivity_batched, plan_steps_layered
+from .planners.step_index import StepIndex
+
+# pipeline stages, in execution order (usable as `stop_after`)
+STAGES = ["voxelize", "pack", "plan", "ldraw", "bom", "render", "pdf"]
+# "batched": whole-model connectivity planner; "layered": per-layer (parallel given `plan_executor`)
+PLANNERS = ("batched", "layered")
+SOLVERS = ("greedy", "ilp")
+
+def new_session(root: str = "outputs") -> Tuple[str, str]:
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    session_id = f"session_{ts}_{uuid.uuid4().hex[:6]}"
+    outdir = os.path.join(root, session_id)
+    os.makedirs(outdir, exist_ok=True)
+    return session_id, outdir
+
+class _StageTimer:
+    def __init__(self, profiler: Optional[StageProfiler] = None):
+        self.timings: Dict[str, float] = {}
+        self.profiler = profiler
+        self.profile_index: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.time()
+        try:
+            if self.profiler is not None:
+                with self.profiler.stage(name):
+                    yield
+            else:
+                yield
+        finally:
+            self.timings[name] = round(time.time() - t0, 4)
+
+    @contextmanager
+    def run(self):
+        """Writes the profile index when the run ends, also when a stage raised."""
+        try:
+            yield
+        finally:
+            if self.profiler is not None:
+                self.profile_index = self.profiler.write_index()
+
+    def finish(self, result: Dict) -> Dict:
+        if self.profiler is not None:
+            result["outputs"]["profile"] = self.profile_index
+        return result
+
+def _check_args(stop_after: Optional[str], planner: str, solver: str = "greedy"):
+    if stop_after is not None and stop_after not in STAGES:
+        raise ValueError(f"unknown stage {stop_after!r}; expected one of {STAGES}")
+    if planner not in PLANNERS:
+        raise ValueError(f"unknown planner {planner!r}; expected one of {PLANNERS}")
+    if solver not in SOLVERS:
+        raise ValueError(f"unknown solver {solver!r}; expected one of {SOLVERS}")
+
+def run_pipeline(
+    spec: DesignSpec,
+    outdir: str,
+    batch_size: int = 8,
+    stop_after: Optional[str] = None,
+    profile: bool = False,
+    catalog: str = DEFAULT_CATALOG,
+    page_url: Optional[str] = None,
+    pdf_url: Optional[str] = None,
+    planner: str = "batched",
+    plan_executor: Optional[Executor] = None,
+    solver: str = "greedy",
+) -> Dict:
+    """Runs prompt spec → voxels → parts → steps → exports in-process.
+    Returns {"spec", "counts", "outputs", "timings"}; when `stop_after` names a
+    stage, later stages are skipped and only what was produced so far is reported.
+    With `profile`, each stage is profiled and outputs["profile"] points at the
+    index of per-stage artifacts (see utils.profiling).
+    With `page_url`, step pages are not pre-rendered: the manual links to that
+    URL template and pages are rendered on demand (export.instructions.render_step_page);
+    the PDF stage is skipped and `pdf_url` is linked instead.
+    `plan_executor` (a process pool owned by the caller) plans layers in
+    parallel for planner="layered"; without it they are planned serially.
+    """
+    _check_args(stop_after, planner, solver)
+    timer = _StageTimer(StageProfiler(outdir) if profile else None)
+    with timer.run():
+        with timer.stage("voxelize"):
+            vox = make_voxels(spec)  # ndarray [H,W,L]
+        result = _run_stages(vox, spec.model_dump(), spec.seed, outdir, batch_size, stop_after, timer, catalog,
+                             page_url, pdf_url, planner, plan_executor, solver)
+    return timer.finish(result)
+
+def run_voxel_pipeline(
+    path: str,
+    outdir: str,
+    fmt: Optional[str] = None,
+    seed: int = 42,
+    batch_size: int = 8,
+    stop_after: Optional[str] = None,
+    profile: bool = False,
+    catalog: str = DEFAULT_CATALOG,
+    page_url: Optional[str] = None,
+    pdf_url: Optional[str] = None,
+    planner: str = "batched",
+    plan_executor: Optional[Executor] = None,
+    solver: str = "greedy",
+) -> Dict:
+    """Same as run_pipeline, but starting from a pre-built voxel grid on disk
+    (see geometry.voxel_io); the "voxelize" stage times loading/validation.
+    """
+    _check_args(stop_after, planner, solver)
+    timer = _StageTimer(StageProfiler(outdir) if profile else None)
+    with timer.run():
+        with timer.stage("voxelize"):
+            vox = load_voxels(path, fmt)  # memory-mapped / lazily unpacked [H,W,L]
+        H, W, L = vox.shape
+        spec = {
+            "category": "imported",
+            "source": os.path.basename(path),
+            "length_studs": L,
+            "width_studs": W,
+            "height_layers": H,
+            "seed": seed,
+        }
+        result = _run_stages(vox, spec, seed, outdir, batch_size, stop_after, timer, catalog,
+                             page_url, pdf_url, planner, plan_executor, solver)
+    return timer.finish(result)
+
+def _run_stages(vox, spec: Dict, seed: int, outdir: str, batch_size: int,
+                stop_after: Optional[str], timer: _StageTimer, catalog: str,
+                page_url: Optional[str] = None, pdf_url: Optional[str] = None,
+                planner: str = "batched", plan_executor: Optional[Executor] = None,
+                solver: str = "greedy") -> Dict:
+    counts: Dict = {}
+    outputs: Dict = {}
+    result = {"spec": spec, "counts": counts, "outputs": outputs, "timings": timer.timings}
+
+    H, W, L = vox.shape
+    counts["studs"] = count_occupied(vox)
+    print(f"[TIMER] voxelize: {timer.timings['voxelize']:.2f}s  grid=({H},{W},{L})")
+    if stop_after == "voxelize":
+        return result
+
+    # --- pack parts
+    with timer.stage("pack"):
+        if solver == "ilp":
+            # OR-Tools is only imported when the CP-SAT packer is actually requested
+            from .optimize.ilp_packer import pack_ilp
+            placements = pack_ilp(vox, seed=seed, catalog=catalog)
+        else:
+            placements = pack_greedy(vox, seed=seed, catalog=catalog)
+    counts["placements"] = len(placements)
+    print(f"[TIMER] pack_{solver}: {timer.timings['pack']:.2f}s  placements={len(placements)}  catalog={catalog}")
+    if stop_after == "pack":
+        return result
+
+    # --- plan steps (connectivity + small batches)
+    batch = int(batch_size) if batch_size and batch_size > 0 else 8
+    with timer.stage("plan"):
+        if planner == "layered":
+            placements, step_count = plan_steps_layered(placements, batch_size=batch, executor=plan_executor)
+        else:
+            placements, step_count = plan_steps_connectivity_batched(placements, batch_size=batch)
+        # one step → parts index shared by every exporter below
+        index = StepIndex(placements)
+    counts["steps"] = step_count
+    print(f"[TIMER] plan_steps: {timer.timings['plan']:.2f}s  steps={step_count}  batch={batch}  planner={planner}")
+    if stop_after == "plan":
+        return result
+
+    # --- write LDraw assembly (optional, for LPub3D later)
+    with timer.stage("ldraw"):
+        outputs["ldr"] = write_assembly(placements, outdir, H, index=index)
+    print(f"[TIMER] write_assembly: {timer.timings['ldraw']:.2f}s")
+    if stop_after == "ldraw":
+        return result
+
+    # --- BOM
+    with timer.stage("bom"):
+        items = make_bom(placements, index=index)
+        outputs["bom_csv"], outputs["bom_json"] = write_bom(items, outdir)
+    print(f"[TIMER] bom: {timer.timings['bom']:.2f}s  items={len(items)}")
+    if stop_after == "bom":
+        return result
+
+    # --- Render pages (PNG with PLI) — first pass with no PDF link.
+    # Placements are kept with the session so pages can be (re)rendered on demand.
+    lazy = page_url is not None
+    with timer.stage("render"):
+        save_session_model(placements, outdir, H, W, L, step_count)
+        write_instruction_set(
+            placements=placements,
+            outdir=outdir,
+            H=H, W=W, L=L,
+            spec=spec,
+            pdf_path=None,
+            step_count=step_count,
+            page_url=page_url,
+            pdf_url=pdf_url,
+            render=not lazy,
+            index=index,
+        )
+    outputs["instructions_html"] = os.path.join(outdir, "instructions.html")
+    print(f"[TIMER] render PNGs: {timer.timings['render']:.2f}s  lazy={lazy}")
+    if stop_after == "render" or lazy:
+        return result
+
+    # --- Stitch PDF, then update HTML with a working PDF link
+    with timer.stage("pdf"):
+        pdf_path = make_pdf_from_pngs(outdir)
+        write_instruction_set(
+            placements=placements,
+            outdir=outdir,
+            H=H, W=W, L=L,
+            spec=spec,
+            pdf_path=pdf_path,
+            step_count=step_count,
+            render=False,
+            index=index,
+        )
+    outputs["instructions_pdf"] = pdf_path if (pdf_path and os.path.isfile(pdf_path)) else None
+    print(f"[TIMER] stitch PDF: {timer.timings['pdf']:.2f}s")
+
+    return result
@@ -0,0 +1,81 @@
+# backend/planners/step_index.py
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..optimize.parts import PART_BY_LDRAW, short_label
+
+PartKey = Tuple[str, str, str]  # (ldraw, name, color)
+
+class StepIndex:
+    """Placements grouped by step, built once after planning and shared by the
+    exporters (BOM, PLI panel, LDraw):
+      placements   sorted by (step, y, x, ldraw); step s is placements[offsets[s]:offsets[s+1]]
+      keys         distinct (ldraw, name, color), in BOM order (ldraw, color)
+      counts       [steps, keys] int32 part counts per step
+      cumulative   running totals per step (counts.cumsum over steps)
+      totals       whole-model counts per key
+    Placements without a "step" are treated as step 0.
+    """
+    def __init__(self, placements: List[Dict]):
+        self.placements = sorted(
+            placements, key=lambda p: (int(p.get("step", 0)), p["y"], p["x"], p["ldraw"])
+        )
+        steps = np.fromiter((int(p.get("step", 0)) for p in self.placements), dtype=np.int64,
+                            count=len(self.placements))
+        self.step_count = int(steps[-1]) + 1 if len(steps) else 0
+        self.offsets = np.searchsorted(steps, np.arange(self.step_count + 1))
+
+        key_set = {(p["ldraw"], p["name"], p["color"]) for p in self.placements}
+        self.keys: List[PartKey] = sorted(key_set, key=lambda k: (k[0], k[2]))
+        key_id = {k: i for i, k in enumerate(self.keys)}
+        kidx = np.fromiter((key_id[(p["ldraw"], p["name"], p["color"])] for p in self.placements),
+                           dtype=np.int64, count=len(self.placements))
+
+        self.counts = np.zeros((self.step_count, len(self.keys)), dtype=np.int32)
+        np.add.at(self.counts, (steps, kidx), 1)
+        self.cumulative = np.cumsum(self.counts, axis=0, dtype=np.int32)
+        self.totals = self.counts.sum(axis=0, dtype=np.int64)
+
+        # footprint per key in the part's canonical orientation (studs along x, y)
+        self.dims: List[Tuple[int, int]] = []
+        for ldraw, name, _ in self.keys:
+            part = PART_BY_LDRAW.get(ldraw)
+            if part is not None:
+                self.dims.append((part["l"], part["w"]))
+            else:
+                first = next(p for p in self.placements if p["ldraw"] == ldraw and p["name"] == name)
+                self.dims.append((int(first["l"]), int(first["w"])))
+
+    def step(self, s: int) -> List[Dict]:
+        return self.placements[self.offsets[s]:self.offsets[s + 1]]
+
+    def before(self, s: int) -> List[Dict]:
+        """Everything placed in steps < s."""
+        return self.placements[:self.offsets[s]]
+
+    def steps(self) -> List[int]:
+        """Steps that place at least one part."""
+        return [int(s) for s in np.nonzero(np.diff(self.offsets))[0]]
+
+    def _items(self, row: np.ndarray) -> List[Dict]:
+        return [
+            {"part_id": ldraw.replace(".dat", ""), "name": name, "color": color, "quantity": int(q)}
+            for (ldraw, name, color), q in zip(self.keys, row) if q
+        ]
+
+    def bom(self, step: Optional[int] = None, upto: Optional[int] = None) -> List[Dict]:
+        """Whole-model BOM, or the parts of one `step`, or the running total through step `upto`."""
+        if step is not None:
+            return self._items(self.counts[step])
+        if upto is not None:
+            return self._items(self.cumulative[upto])
+        return self._items(self.totals)
+
+    def pli(self, s: int) -> List[Tuple[str, str, str, int, int, int]]:
+        """Parts-list rows for step s: (ldraw, color, label, qty, l, w)."""
+        row = self.counts[s]
+        return [
+            (ldraw, color, short_label(name) or ldraw, int(row[i]), *self.dims[i])
+            for i, (ldraw, name, color) in enumerate(self.keys) if row[i]
+        ]
@@ -1,11 +1,20 @@
 # backend/planners/step_planner.py
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Optional, Tuple, Set
 from collections import defaultdict
+from concurrent.futures import Executor
 import math
 
 Cell = Tuple[int, int, int]  # (z, x, y)
 
 def _cells(p: Dict) -> Set[Cell]:
+    # bricks (h=3) occupy the layers z..z+h-1
+    z = int(p.get("z", 0))
+    x0, y0 = int(p["x"]), int(p["y"])
+    w, l, h = int(p["w"]), int(p["l"]), int(p.get("h", 1))
+    return {(z + dz, x0 + dx, y0 + dy) for dz in range(h) for dx in range(l) for dy in range(w)}
+
+def _base_cells(p: Dict) -> Set[Cell]:
+    # the bottom layer of a part, which is what needs support
     z = int(p.get("z", 0))
     x0, y0 = int(p["x"]), int(p["y"])
     w, l = int(p["w"]), int(p["l"])
@@ -54,8 +63,8 @@ def _supported_hard(below_occ: Set[Tuple[int,int]], cells: Set[Cell]) -> bool:
 def _build_below_occ(placements: List[Dict]) -> dict:
     occ_by_z = defaultdict(set)
     for p in placements:
-        for (_, x, y) in _cells(p):
-            occ_by_z[int(p.get("z", 0))].add((x, y))
+        for (z, x, y) in _cells(p):
+            occ_by_z[z].add((x, y))
     return occ_by_z
 
 def _nearest_to_cluster(p: Dict, cluster_centers):
@@ -71,9 +80,15 @@ def plan_steps_connectivity_batched(
 ):
     if not placements:
         return placements, 0
+    occ_by_z = _build_below_occ(placements)
+    steps = _plan_group(placements, occ_by_z, batch_size, log_every)
+    return placements, steps
 
+def _plan_group(placements: List[Dict], occ_by_z, batch_size: int, log_every: int) -> int:
+    """Assigns p["step"] (from 0) to every placement in the group; returns the
+    number of steps. Support is checked against the full occupancy `occ_by_z`.
+    """
     MAX_ITERS = 10 * len(placements)
-    occ_by_z = _build_below_occ(placements)
 
     by_z = defaultdict(list)
     for p in placements:
@@ -82,6 +97,7 @@ def plan_steps_connectivity_batched(
         by_z[z].sort(key=lambda q: (int(q["y"]), int(q["x"]), q["ldraw"]))
 
     placed_cells: Set[Cell] = set()
+    placed_z: Set[int] = set()
     cluster_centers_by_z = defaultdict(list)
 
     remaining: List[Dict] = []
@@ -112,11 +128,10 @@ def plan_steps_connectivity_batched(
             cells = _cells(p)
             z = int(p.get("z", 0))
             below = occ_by_z[z-1] if z > 0 else set()
-            if not _supported_hard(below, cells):
+            if not _supported_hard(below, _base_cells(p)):
                 continue
 
-            has_any_on_z = any(c[0] == z for c in placed_cells)
-            if has_any_on_z:
+            if z in placed_z:
                 if _touches_same_z(placed_cells, cells):
                     strict.append(p)
                 else:
@@ -134,7 +149,7 @@ def plan_steps_connectivity_batched(
                 # last resort: any supported piece
                 for p in remaining:
                     z = int(p.get("z", 0))
-                    if _supported_hard(occ_by_z[z-1] if z > 0 else set(), _cells(p)):
+                    if _supported_hard(occ_by_z[z-1] if z > 0 else set(), _base_cells(p)):
                         picked.append(p)
                         break
                 if not picked:
@@ -145,14 +160,59 @@ def plan_steps_connectivity_batched(
             z = int(p.get("z", 0))
             for c in _cells(p):
                 placed_cells.add(c)
+                placed_z.add(c[0])
             cluster_centers_by_z[z].append(_center_xy(p))
 
         ids = set(id(p) for p in picked)
         remaining = [p for p in remaining if id(p) not in ids]
 
         assigned += len(picked)
-        if step % log_every == 0:
+        if log_every and step % log_every == 0:
             print(f"[INFO] step {step}: placed {assigned}/{N}")
         step += 1
 
-    return placements, step
+    return step
+
+def _plan_layer(task) -> List[int]:
+    # process-pool worker: plan one layer, return the local step of each part
+    parts, below, batch_size = task
+    z = int(parts[0].get("z", 0))
+    occ_by_z = defaultdict(set)
+    occ_by_z[z - 1] = below
+    _plan_group(parts, occ_by_z, batch_size, log_every=0)
+    return [int(p["step"]) for p in parts]
+
+def plan_steps_layered(
+    placements: List[Dict],
+    batch_size: int = 8,
+    executor: Optional[Executor] = None,
+):
+    """Plans each z-layer on its own (steps never mix layers) and numbers the
+    steps globally, layer by layer. A part's eligibility depends only on its own
+    layer's placed cells and the fully known occupancy of the layer below, so
+    layers can be planned in parallel on `executor` (a process pool owned by the
+    caller, e.g. backend.batch --plan-workers). Without one, layers are planned
+    serially in-process; no pool is ever started per call. The result is the
+    same either way.
+    """
+    if not placements:
+        return placements, 0
+    occ_by_z = _build_below_occ(placements)
+
+    by_z = defaultdict(list)
+    for p in placements:
+        by_z[int(p.get("z", 0))].append(p)
+    layers = sorted(by_z)
+    tasks = [(by_z[z], occ_by_z.get(z - 1, set()), batch_size) for z in layers]
+
+    if executor is not None and len(tasks) > 1:
+        local_steps = list(executor.map(_plan_layer, tasks))
+    else:
+        local_steps = [_plan_layer(t) for t in tasks]
+
+    offset = 0
+    for z, steps in zip(layers, local_steps):
+        for p, s in zip(by_z[z], steps):
+            p["step"] = offset + s
+        offset += 1 + max(steps)
+    return placements, offset
@@ -0,0 +1,175 @@
+# backend/serve.py
+"""Runs the API with optional preloading and prefork workers.
+
+    python -m backend.serve --port 8000 --workers 4 --preload
+
+--preload imports the app and runs backend.warmup.warm() once in the parent
+before any worker starts. With --workers > 1 the parent then binds the listening
+socket, freezes the GC (so collections in the workers do not write to, and thus
+copy, the shared pages) and forks the workers, which inherit the warmed state
+copy-on-write instead of each rebuilding it. The session-store compactor runs in
+a forked process of its own, so the parent never has a thread when it forks. The
+parent restarts workers (and the compactor) that die, backing off when they die
+quickly, and gives up after MAX_FAST_EXITS fast deaths in a row.
+
+Each worker has its own admission controller: LIGHT_CONCURRENCY, HEAVY_WORKERS
+and HEAVY_QUEUE apply per worker, so a server with N workers admits N times as
+much. Divide them by the worker count to keep the single-process limits.
+
+Without fork (Windows) or with --workers 1 this is plain uvicorn in one process.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+RESTART_BACKOFF_S = 0.5      # first restart delay; doubles per fast death in a row
+RESTART_BACKOFF_MAX_S = 30.0
+FAST_EXIT_S = 10.0           # a child that dies sooner than this counts as a fast death
+MAX_FAST_EXITS = 5
+
+class _Backoff:
+    """Restart delays for children that die soon after they start."""
+    def __init__(self, base_s: float, max_s: float, fast_s: float, max_fast: int):
+        self.base_s, self.max_s, self.fast_s, self.max_fast = base_s, max_s, fast_s, max_fast
+        self.fast = 0
+
+    def next_delay(self, lifetime_s: float) -> Optional[float]:
+        """Seconds to wait before the restart, or None to give up."""
+        if lifetime_s >= self.fast_s:
+            self.fast = 0
+            return self.base_s
+        self.fast += 1
+        if self.fast >= self.max_fast:
+            return None
+        return min(self.max_s, self.base_s * 2 ** (self.fast - 1))
+
+def _serve_worker(sock: socket.socket, log_level: str):
+    import uvicorn
+    from . import api
+    api.STORE_COMPACT_INTERVAL = 0   # the compactor process owns the store's upkeep
+    config = uvicorn.Config(api.app, log_level=log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def _run_compactor(interval_s: float):
+    from . import api
+    store = api.session_store()
+    while True:
+        time.sleep(interval_s)
+        try:
+            store.compact()
+        except Exception as e:  # keep the compactor alive
+            print("[WARN] store compaction failed:", e)
+
+def _fork(target: Callable, *args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            target(*args)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+    return pid
+
+def _prefork(args) -> int:
+    from . import api
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if threading.active_count() > 1:
+        print(f"[WARN] forking workers from a process with {threading.active_count()} threads")
+    gc.collect()
+    gc.freeze()
+    compact_s = api.STORE_COMPACT_INTERVAL
+    spawn = {"worker": lambda: _fork(_serve_worker, sock, args.log_level),
+             "compactor": lambda: _fork(_run_compactor, compact_s)}
+    children = {}   # pid -> (role, start time)
+    def start(role):
+        children[spawn[role]()] = (role, time.monotonic())
+    for _ in range(args.workers):
+        start("worker")
+    workers = sorted(pid for pid, (role, _) in children.items() if role == "worker")
+    print(f"[INFO] serving on {args.host}:{args.port} with {len(workers)} workers (pids {workers})")
+    if compact_s > 0:
+        start("compactor")
+
+    stopping = False
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    backoff = _Backoff(RESTART_BACKOFF_S, RESTART_BACKOFF_MAX_S, FAST_EXIT_S, MAX_FAST_EXITS)
+    code = 0
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if pid not in children:
+            continue
+        role, started = children.pop(pid)
+        if stopping:
+            continue
+        exit_code = os.waitstatus_to_exitcode(status)
+        delay = backoff.next_delay(time.monotonic() - started)
+        if delay is None:
+            print(f"[WARN] {role} {pid} exited (code {exit_code}); {MAX_FAST_EXITS} fast exits in a row, "
+                  f"shutting down")
+            code = 1
+            stop(None, None)
+            continue
+        print(f"[WARN] {role} {pid} exited (code {exit_code}); restarting in {delay:.1f}s")
+        time.sleep(delay)
+        if not stopping:
+            start(role)
+    return code
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m backend.serve", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--preload", action="store_true", help="warm up once before serving")
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+
+    if args.preload:
+        from .warmup import warm
+        warm()
+    if args.workers > 1 and hasattr(os, "fork"):
+        return _prefork(args)
+    if args.workers > 1:
+        print("[WARN] prefork needs os.fork(); running a single worker")
+    import uvicorn
+    from . import api
+    uvicorn.run(api.app, host=args.host, port=args.port, log_level=args.log_level, access_log=False)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# backend/utils/admission.py
+"""Admission control for pipeline requests, driven by cost_model estimates.
+
+  reject  estimate above ADMIT_MAX_SECONDS or ADMIT_MAX_MEMORY_MB
+  heavy   estimate above ADMIT_HEAVY_SECONDS: runs in a separate process pool of
+          HEAVY_WORKERS; up to HEAVY_QUEUE more wait, beyond that the request is
+          turned away as busy (retry later)
+  light   everything else: runs in the server's thread pool, at most
+          LIGHT_CONCURRENCY at a time (the rest wait)
+
+Keeping heavy runs in their own processes means a few large models cannot
+occupy every thread and starve the small, fast requests. The heavy pool starts
+its processes with forkserver (spawn where that is unavailable), never by
+forking the multi-threaded server, whose locks may be held mid-fork.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+class AdmissionRejected(Exception):
+    """`status` is 413 for requests over budget, 429 when the heavy queue is full."""
+    def __init__(self, status: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+class AdmissionController:
+    def __init__(self, max_seconds: float = 600.0, max_memory_mb: float = 4096.0,
+                 heavy_seconds: float = 20.0, light_concurrency: int = 4,
+                 heavy_workers: int = 1, heavy_queue: int = 4):
+        self.max_seconds = max_seconds
+        self.max_memory_mb = max_memory_mb
+        self.heavy_seconds = heavy_seconds
+        self.light_concurrency = max(1, int(light_concurrency))
+        self.heavy_workers = max(1, int(heavy_workers))
+        self.heavy_queue = max(0, int(heavy_queue))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._light: Optional[asyncio.Semaphore] = None
+        self._heavy: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.stats = {
+            "light_running": 0, "heavy_running": 0, "heavy_waiting": 0,
+            "admitted_light": 0, "admitted_heavy": 0, "rejected_budget": 0, "rejected_busy": 0,
+        }
+
+    def decide(self, est: Dict) -> Dict:
+        """{"route": "light" | "heavy" | "reject", "reason": str}."""
+        if est["total_seconds"] > self.max_seconds:
+            return {"route": "reject",
+                    "reason": f"estimated {est['total_seconds']:.0f}s exceeds the {self.max_seconds:.0f}s budget"}
+        if est["memory_mb"] > self.max_memory_mb:
+            return {"route": "reject",
+                    "reason": f"estimated {est['memory_mb']:.0f} MB exceeds the {self.max_memory_mb:.0f} MB budget"}
+        if est["total_seconds"] > self.heavy_seconds:
+            return {"route": "heavy", "reason": f"estimated {est['total_seconds']:.1f}s > {self.heavy_seconds:.0f}s"}
+        return {"route": "light", "reason": ""}
+
+    def _semaphores(self):
+        # semaphores bind to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._light = asyncio.Semaphore(self.light_concurrency)
+            self._heavy = asyncio.Semaphore(self.heavy_workers)
+            self._loop = loop
+        return self._light, self._heavy
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(max_workers=self.heavy_workers,
+                                             mp_context=multiprocessing.get_context(method))
+        return self._pool
+
+    def metrics(self) -> Dict:
+        return {
+            **self.stats,
+            "max_seconds": self.max_seconds, "max_memory_mb": self.max_memory_mb,
+            "heavy_seconds": self.heavy_seconds, "light_concurrency": self.light_concurrency,
+            "heavy_workers": self.heavy_workers, "heavy_queue": self.heavy_queue,
+        }
+
+    def admit(self, est: Dict) -> Dict:
+        """The routing decision for `est`; raises AdmissionRejected if over budget."""
+        decision = self.decide(est)
+        if decision["route"] == "reject":
+            self.stats["rejected_budget"] += 1
+            raise AdmissionRejected(413, decision["reason"])
+        return decision
+
+    async def run(self, decision: Dict, fn: Callable, *args, **kwargs):
+        """Runs fn(*args, **kwargs) on the route from `admit`. Heavy runs happen in
+        another process, so `fn` and its arguments must be picklable; raises
+        AdmissionRejected(429) when the heavy queue is full.
+        """
+        light, heavy = self._semaphores()
+        if decision["route"] == "light":
+            self.stats["admitted_light"] += 1
+            async with light:
+                self.stats["light_running"] += 1
+                try:
+                    return await run_in_threadpool(fn, *args, **kwargs)
+                finally:
+                    self.stats["light_running"] -= 1
+
+        if heavy.locked() and self.stats["heavy_waiting"] >= self.heavy_queue:
+            self.stats["rejected_busy"] += 1
+            raise AdmissionRejected(429, f"heavy queue full ({self.stats['heavy_waiting']} waiting)")
+        self.stats["admitted_heavy"] += 1
+        self.stats["heavy_waiting"] += 1
+        try:
+            await heavy.acquire()
+        finally:
+            self.stats["heavy_waiting"] -= 1
+        self.stats["heavy_running"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor(), _call, fn, args, kwargs)
+        finally:
+            self.stats["heavy_running"] -= 1
+            heavy.release()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+def _call(fn: Callable, args, kwargs):
+    return fn(*args, **kwargs)
+
+_controller: Optional[AdmissionController] = None
+
+def get_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            max_seconds=float(os.getenv("ADMIT_MAX_SECONDS", "600")),
+            max_memory_mb=float(os.getenv("ADMIT_MAX_MEMORY_MB", "4096")),
+            heavy_seconds=float(os.getenv("ADMIT_HEAVY_SECONDS", "20")),
+            light_concurrency=int(os.getenv("LIGHT_CONCURRENCY", "4")),
+            heavy_workers=int(os.getenv("HEAVY_WORKERS", "1")),
+            heavy_queue=int(os.getenv("HEAVY_QUEUE", "4")),
+        )
+    return _controller
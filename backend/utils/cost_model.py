@@ -0,0 +1,137 @@
+# backend/utils/cost_model.py
+"""Predicts per-request work (voxels, parts, steps, pages) and per-stage time
+and memory from a DesignSpec and request options, before running anything.
+
+Every prediction is a non-negative linear combination of a few size features
+(see `_features`). Coefficients default to DEFAULT_COEFFS and are replaced by
+cost_calibration.json next to this file when present; regenerate that with
+`python scripts/calibrate_cost.py` on the target hardware.
+"""
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+from ..export.instructions import page_size
+from ..optimize.parts import DEFAULT_CATALOG, footprints
+
+CALIBRATION_PATH = os.path.join(os.path.dirname(__file__), "cost_calibration.json")
+
+ILP_LAYER_CAP_S = 5.0   # CP-SAT time limit per layer in ilp_packer
+
+DEFAULT_COEFFS: Dict = {
+    # occupied fraction of the L×W×H box, by category
+    "fill": {"spaceship": 0.45, "imported": 0.5, "default": 1.0},
+    # count models: value = sum(coef * feature). Shaped grids (spaceship,
+    # imported) have far more edges than solid boxes, so more small parts and
+    # more, smaller connected steps
+    "placements": {"voxels_basic": 0.15, "voxels_plates": 0.08, "voxels_full": 0.06,
+                   "shaped_voxels_basic": 0.3, "shaped_voxels_plates": 0.15, "shaped_voxels_full": 0.1},
+    "steps": {"placements_per_batch": 1.0, "shaped_placements": 0.4},
+    # stage seconds
+    "voxelize": {"cells": 3e-6},
+    "pack_greedy": {"cells_x_footprints": 5e-7, "placements": 1e-5},
+    "pack_ilp": {"cells_x_footprints": 2e-5},
+    "plan_batched": {"placements_x_steps": 1e-6},
+    "plan_layered": {"placements_sq_per_layer": 2e-6},
+    "ldraw": {"placements": 1e-5},
+    "bom": {"placements": 2e-6},
+    "render_eager": {"pages_x_px": 2.5e-8, "pages_x_placements": 5e-6},
+    "render_lazy": {"steps": 2e-5},
+    "pdf": {"pages_x_px": 4e-8},
+    # peak resident memory, MB; the PDF stitcher keeps every page decoded
+    # (~11 bytes/px measured: 183 pages of 2650x1072 px peaked at 5.7 GB)
+    "memory_mb": {"base": 120.0, "placements": 0.002, "pdf_pages_x_px": 1.1e-5, "page_px": 1.2e-5},
+}
+
+@lru_cache(maxsize=1)
+def load_coeffs() -> Dict:
+    coeffs = json.loads(json.dumps(DEFAULT_COEFFS))
+    if os.path.isfile(CALIBRATION_PATH):
+        with open(CALIBRATION_PATH, "r", encoding="utf-8") as f:
+            calibrated = json.load(f).get("coeffs", {})
+        for k, v in calibrated.items():
+            coeffs.setdefault(k, {}).update(v)
+    return coeffs
+
+def _lin(coefs: Dict[str, float], feats: Dict[str, float]) -> float:
+    return sum(c * feats.get(k, 0.0) for k, c in coefs.items())
+
+SHAPED = ("spaceship", "imported")
+
+def _features(H: int, W: int, L: int, voxels: float, placements: float, steps: float,
+              pages: int, catalog: str, batch_size: int = 8, shaped: bool = False) -> Dict[str, float]:
+    pw, ph = page_size(W, L)
+    cells = float(H * W * L)
+    return {
+        "cells": cells,
+        "cells_x_footprints": cells * len(footprints(catalog)),
+        "voxels": voxels,
+        f"{'shaped_' if shaped else ''}voxels_{catalog}": voxels,
+        "placements": placements,
+        "placements_per_batch": placements / max(1, batch_size),
+        "shaped_placements": placements if shaped else 0.0,
+        "placements_x_steps": placements * steps,
+        "placements_sq_per_layer": placements * placements / max(1, H),
+        "steps": steps,
+        "page_px": float(pw * ph),
+        "pages_x_px": float(pages * pw * ph),
+        "pages_x_placements": pages * placements,
+        "base": 1.0,
+    }
+
+def estimate_grid(
+    H: int, W: int, L: int,
+    voxels: Optional[float] = None,
+    category: str = "default",
+    batch_size: int = 8,
+    catalog: str = DEFAULT_CATALOG,
+    solver: str = "greedy",
+    planner: str = "batched",
+    pages: str = "lazy",
+) -> Dict:
+    """Estimate for an H×W×L grid. `voxels` defaults to the category's fill ratio."""
+    c = load_coeffs()
+    batch = batch_size if batch_size and batch_size > 0 else 8
+    shaped = category in SHAPED
+    if voxels is None:
+        fill = c["fill"].get(category, c["fill"]["default"])
+        voxels = fill * H * W * L
+    placements = _lin(c["placements"], _features(H, W, L, voxels, 0, 0, 0, catalog, batch, shaped))
+    steps = max(1.0, _lin(c["steps"], _features(H, W, L, voxels, placements, 0, 0, catalog, batch, shaped)))
+    n_pages = int(round(steps)) if pages == "eager" else 0
+    f = _features(H, W, L, voxels, placements, steps, n_pages, catalog, batch, shaped)
+
+    seconds = {
+        "voxelize": _lin(c["voxelize"], f),
+        "pack": (min(H * ILP_LAYER_CAP_S, _lin(c["pack_ilp"], f)) if solver == "ilp"
+                 else _lin(c["pack_greedy"], f)),
+        "plan": _lin(c["plan_layered"] if planner == "layered" else c["plan_batched"], f),
+        "ldraw": _lin(c["ldraw"], f),
+        "bom": _lin(c["bom"], f),
+        "render": _lin(c["render_eager"] if pages == "eager" else c["render_lazy"], f),
+        "pdf": _lin(c["pdf"], f) if pages == "eager" else 0.0,
+    }
+    m = c["memory_mb"]
+    memory_mb = m["base"] + max(
+        voxels / 1e6,
+        m["placements"] * placements,
+        m["page_px"] * f["page_px"],
+        m["pdf_pages_x_px"] * f["pages_x_px"],
+    )
+    return {
+        "grid": [H, W, L],
+        "voxels": int(voxels),
+        "placements": int(placements),
+        "steps": int(round(steps)),
+        "pages": n_pages,
+        "seconds": {k: round(v, 3) for k, v in seconds.items()},
+        "total_seconds": round(sum(seconds.values()), 3),
+        "memory_mb": round(memory_mb, 1),
+    }
+
+def estimate(spec, **opts) -> Dict:
+    """Estimate for a DesignSpec; `opts` as in estimate_grid."""
+    return estimate_grid(spec.height_layers, spec.width_studs, spec.length_studs,
+                         category=spec.category if spec.category in load_coeffs()["fill"] else "default",
+                         **opts)
@@ -0,0 +1,38 @@
+# backend/utils/fileio.py
+"""Atomic file writes: write to a temp file beside the target, then rename.
+
+Readers never see a partial file, and replacing a file never writes through to
+its old inode — which matters because session files may be hard links into the
+shared content store (utils/session_store.py).
+"""
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", **kwargs):
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, mode, **kwargs) as fh:
+            yield fh
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def link_or_copy(src: str, dst: str):
+    """Atomically makes dst a hard link to src, or a copy where links are not supported."""
+    tmp = _tmp_path(dst)
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
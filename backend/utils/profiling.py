@@ -0,0 +1,149 @@
+# backend/utils/profiling.py
+"""Opt-in per-stage profiling for pipeline runs.
+
+PROFILER selects the backend: "auto" (default; pyinstrument sampling if it is
+installed, else cProfile), "pyinstrument", "cprofile", or "off" (ignore profile
+requests server-wide). PROFILE_INTERVAL_MS sets the sampling interval, clamped
+to [1, 100] ms so a profiled request stays within a small constant overhead.
+
+That bound only holds for pyinstrument. cProfile is deterministic: it hooks
+every call, so its overhead grows with the call count and can multiply a
+stage's run time. Only one cProfile session runs at a time (Python 3.12+ allows
+a single active profiler per process); a stage that cannot get it, or finds
+another tool already profiling, runs unprofiled and is marked "skipped".
+"""
+import cProfile
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .fileio import atomic_open
+
+MIN_INTERVAL_MS = 1.0
+MAX_INTERVAL_MS = 100.0
+TOP_N = 25
+
+_cprofile_lock = threading.Lock()
+
+def _backend() -> Optional[str]:
+    choice = os.getenv("PROFILER", "auto").lower()
+    if choice == "off":
+        return None
+    if choice in ("auto", "pyinstrument"):
+        try:
+            import pyinstrument  # noqa: F401
+            return "pyinstrument"
+        except ImportError:
+            if choice == "pyinstrument":
+                print("[WARN] PROFILER=pyinstrument but it is not installed; using cProfile.")
+    return "cprofile"
+
+def _interval_s() -> float:
+    try:
+        ms = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+    except ValueError:
+        ms = 1.0
+    return min(MAX_INTERVAL_MS, max(MIN_INTERVAL_MS, ms)) / 1000.0
+
+def _top_functions(stats: pstats.Stats, n: int = TOP_N) -> List[Dict]:
+    rows = []
+    for (fname, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": f"{func} ({os.path.basename(fname)}:{line})",
+            "calls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:n]
+
+class StageProfiler:
+    """Profiles each `stage(name)` block separately and writes one artifact per
+    stage under <outdir>/profile/, plus a profile.json index.
+    """
+    def __init__(self, outdir: str):
+        self.dir = os.path.join(outdir, "profile")
+        self.backend = _backend()
+        self.interval = _interval_s()
+        self.stages: Dict[str, Dict] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        if self.backend == "pyinstrument":
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import SpeedscopeRenderer
+            prof = Profiler(interval=self.interval)
+            t0 = time.time()
+            prof.start()
+            try:
+                yield
+            finally:
+                prof.stop()
+                path = os.path.join(self.dir, f"{name}.speedscope.json")
+                with atomic_open(path, "w", encoding="utf-8") as fh:
+                    fh.write(prof.output(SpeedscopeRenderer()))
+                self.stages[name] = {"wall": round(time.time() - t0, 4), "artifact": path}
+        else:
+            t0 = time.time()
+            prof = self._start_cprofile()
+            if prof is None:
+                try:
+                    yield
+                finally:
+                    self.stages[name] = {"wall": round(time.time() - t0, 4), "skipped": "another profiler is active"}
+                return
+            try:
+                yield
+            finally:
+                prof.disable()
+                _cprofile_lock.release()
+                path = os.path.join(self.dir, f"{name}.pstats")
+                # what dump_stats() does, but replacing the file: it may be a store link
+                prof.create_stats()
+                with atomic_open(path, "wb") as fh:
+                    marshal.dump(prof.stats, fh)
+                self.stages[name] = {
+                    "wall": round(time.time() - t0, 4),
+                    "artifact": path,
+                    "top": _top_functions(pstats.Stats(prof)),
+                }
+
+    @staticmethod
+    def _start_cprofile() -> Optional[cProfile.Profile]:
+        """An enabled profiler holding _cprofile_lock, or None if profiling is busy."""
+        if not _cprofile_lock.acquire(blocking=False):
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:   # 3.12+: "Another profiling tool is already active"
+            _cprofile_lock.release()
+            return None
+        return prof
+
+    def write_index(self) -> Optional[str]:
+        if not self.stages:
+            return None
+        path = os.path.join(self.dir, "profile.json")
+        with atomic_open(path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "backend": self.backend,
+                # cProfile traces every call: no interval, and no overhead bound
+                "sampling": self.backend == "pyinstrument",
+                "interval_s": self.interval if self.backend == "pyinstrument" else None,
+                "stages": self.stages,
+            }, fh, indent=2)
+        return path
@@ -0,0 +1,363 @@
+# backend/utils/session_store.py
+"""Content-addressed storage for session outputs, with a disk quota.
+
+Sessions stay plain directories under the outputs root, so every reader
+(FileResponse, LPub3D, the PDF stitcher) works on ordinary paths. When a
+session is committed, each file is hashed and moved into <root>/.store/ab/<sha256>,
+and the session path becomes a hard link to that blob. Identical artifacts from
+different sessions therefore share one copy on disk, and a blob whose link
+count drops to 1 is referenced by no session and can be deleted.
+
+Writers must replace files (utils/fileio.atomic_open), never rewrite them in
+place, or the shared blob would change under every session linking to it. Blobs
+are not made read-only: a blob and its session paths are one inode, and on
+Windows read-only files cannot be deleted, so eviction would free nothing.
+Where hard links are unsupported, session files stay plain copies.
+
+Each committed session has a .manifest.json (path -> sha256, size, inode) whose
+mtime is the session's last access. compact() ingests files added or replaced
+since the commit (e.g. lazily rendered pages; unchanged files keep their inode
+and are not re-hashed), deletes sessions idle longer than the TTL, then
+evicts least-recently-used sessions until usage fits the quota. Sessions without
+a manifest are still being written and are only removed once older than the TTL.
+
+Cache directories (e.g. the LPub3D PDF cache) count towards the quota too. Their
+files are expired and evicted by mtime alongside the sessions; the owner should
+touch a file on each hit.
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .fileio import atomic_open
+
+MANIFEST = ".manifest.json"
+STORE_DIR = ".store"
+PROTECT_S = 60.0          # never evict a session touched this recently
+STALE_TMP_S = 3600.0      # leftover *.tmp files older than this are removed
+
+def file_hash(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while True:
+            b = fh.read(chunk)
+            if not b:
+                break
+            h.update(b)
+    return h.hexdigest()
+
+def _clear_readonly(func, path, _exc):
+    # blobs from older stores were read-only, which Windows refuses to delete
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+def remove_tree(path: str):
+    """shutil.rmtree that also removes read-only files; missing paths are ignored."""
+    try:
+        shutil.rmtree(path, onerror=_clear_readonly)
+    except FileNotFoundError:
+        pass
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except PermissionError:
+        os.chmod(path, stat.S_IWRITE)
+        os.remove(path)
+
+def _session_files(outdir: str):
+    for dirpath, _, files in os.walk(outdir):
+        for name in files:
+            if name == MANIFEST or name.endswith(".tmp"):
+                continue
+            path = os.path.join(dirpath, name)
+            yield os.path.relpath(path, outdir).replace(os.sep, "/"), path
+
+class SessionStore:
+    def __init__(self, root: str = "outputs", quota_bytes: int = 0, ttl_s: float = 0.0,
+                 caches: Iterable[str] = ()):
+        """quota_bytes / ttl_s of 0 disable the quota / expiry."""
+        self.root = root
+        self.blobs = os.path.join(root, STORE_DIR)
+        self.quota_bytes = int(quota_bytes)
+        self.ttl_s = float(ttl_s)
+        self.caches: List[str] = []
+        for path in caches:
+            self.add_cache(path)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {
+            "commits": 0, "files_ingested": 0, "deduplicated_bytes": 0,
+            "compactions": 0, "expired": 0, "evicted": 0, "cache_files_removed": 0, "blobs_removed": 0,
+            "last_compaction": None,
+        }
+
+    def add_cache(self, path: str):
+        """Counts the files under `path` towards the quota and evicts them by mtime."""
+        path = os.path.normpath(path)
+        if path not in self.caches:
+            self.caches.append(path)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs, digest[:2], digest)
+
+    def _ingest(self, path: str) -> Tuple[str, int, bool]:
+        """Links `path` to its blob; returns (sha256, size, deduplicated)."""
+        size = os.path.getsize(path)
+        digest = file_hash(path)
+        blob = self._blob_path(digest)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if os.path.isfile(blob):
+                # replace the session copy with a link to the existing blob
+                os.link(blob, tmp)
+                os.replace(tmp, path)
+                return digest, size, True
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            btmp = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+            os.link(path, btmp)
+            os.replace(btmp, blob)
+            return digest, size, False
+        except OSError:
+            # no hard links here (or a race lost): keep the plain file
+            for t in (tmp, f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"):
+                if os.path.exists(t):
+                    os.remove(t)
+            return digest, size, False
+
+    def _read_manifest(self, outdir: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(outdir, MANIFEST), "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def commit(self, outdir: str, touch: bool = True) -> Dict:
+        """Moves the session's files into the store (files already linked are
+        skipped) and writes its manifest. Call once the request has finished writing.
+        With touch=False the session's last-access time is left as it was.
+        """
+        existing = self._read_manifest(outdir)
+        manifest = existing or {"created": time.time(), "files": {}}
+        files = manifest["files"]
+        added = deduped = 0
+        for rel, path in _session_files(outdir):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            known = files.get(rel)
+            if known and known["size"] == st.st_size:
+                # replacing a file gives it a new inode; manifests without one
+                # fall back to "still linked to a blob"
+                unchanged = known["ino"] == st.st_ino if "ino" in known else st.st_nlink > 1
+                if unchanged:
+                    continue
+            digest, size, dup = self._ingest(path)
+            files[rel] = {"sha256": digest, "size": size, "ino": os.stat(path).st_ino}
+            added += 1
+            deduped += size if dup else 0
+        path = os.path.join(outdir, MANIFEST)
+        if added or existing is None:
+            last = os.path.getmtime(path) if existing is not None else None
+            with atomic_open(path, "w", encoding="utf-8") as fh:
+                json.dump(manifest, fh, indent=1, sort_keys=True)
+            if last is not None and not touch:
+                os.utime(path, (last, last))
+        if touch:
+            self.touch(outdir)
+        self.stats["commits"] += 1
+        self.stats["files_ingested"] += added
+        self.stats["deduplicated_bytes"] += deduped
+        return {"files": len(files), "ingested": added, "deduplicated_bytes": deduped}
+
+    def touch(self, outdir: str):
+        """Marks a session as used now (LRU order)."""
+        try:
+            os.utime(os.path.join(outdir, MANIFEST))
+        except OSError:
+            pass
+
+    def sessions(self) -> List[Tuple[str, float, bool]]:
+        """(path, last access, committed) for every session directory."""
+        out = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return out
+        for name in names:
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            manifest = os.path.join(path, MANIFEST)
+            if os.path.isfile(manifest):
+                out.append((path, os.path.getmtime(manifest), True))
+            elif name.startswith("session_"):
+                out.append((path, os.path.getmtime(path), False))
+        return out
+
+    def cache_files(self) -> List[Tuple[str, float]]:
+        """(path, mtime) of every finished file in the cache directories."""
+        out = []
+        for top in self.caches:
+            for dirpath, _, files in os.walk(top):
+                for name in files:
+                    if ".tmp" in name:   # still being written
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        out.append((path, os.path.getmtime(path)))
+                    except FileNotFoundError:
+                        continue
+        return out
+
+    def usage(self) -> int:
+        """Bytes on disk held by the blobs, sessions and caches, counting each inode once."""
+        seen, total = set(), 0
+        for top in [self.blobs] + [path for path, _, _ in self.sessions()] + self.caches:
+            for dirpath, _, files in os.walk(top):
+                for name in files:
+                    try:
+                        st = os.lstat(os.path.join(dirpath, name))
+                    except FileNotFoundError:
+                        continue
+                    if (st.st_dev, st.st_ino) not in seen:
+                        seen.add((st.st_dev, st.st_ino))
+                        total += st.st_size
+        return total
+
+    def _reclaimable(self, outdir: str) -> int:
+        """Bytes freed by deleting this session: files no other session links to."""
+        files = (self._read_manifest(outdir) or {"files": {}})["files"]
+        freed = 0
+        for rel, path in _session_files(outdir):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # an ingested file is also linked from its blob, which sweep() then drops
+            in_store = rel in files and os.path.isfile(self._blob_path(files[rel]["sha256"]))
+            if st.st_nlink <= (2 if in_store else 1):
+                freed += st.st_size
+        return freed
+
+    def sweep(self) -> int:
+        """Deletes blobs no session links to and stale temp files; returns blobs removed."""
+        removed = 0
+        now = time.time()
+        for dirpath, _, files in os.walk(self.blobs):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp"):
+                    if now - st.st_mtime > STALE_TMP_S:
+                        os.remove(path)
+                elif st.st_nlink <= 1:
+                    _remove_file(path)
+                    removed += 1
+        return removed
+
+    def compact(self) -> Dict:
+        with self._lock:
+            now = time.time()
+            expired = evicted = cache_removed = 0
+            live = []
+            for path, last, committed in self.sessions():
+                if self.ttl_s and now - last > self.ttl_s:
+                    remove_tree(path)
+                    expired += 1
+                elif committed:
+                    self.commit(path, touch=False)   # pages rendered since the request finished
+                    live.append((last, path, False))
+            for path, last in self.cache_files():
+                if self.ttl_s and now - last > self.ttl_s:
+                    _remove_file(path)
+                    cache_removed += 1
+                else:
+                    live.append((last, path, True))
+            if self.quota_bytes:
+                usage = self.usage()
+                for last, path, is_cache in sorted(live):
+                    if usage <= self.quota_bytes:
+                        break
+                    if now - last < PROTECT_S:
+                        continue
+                    if is_cache:
+                        try:
+                            st = os.stat(path)
+                        except FileNotFoundError:
+                            continue
+                        usage -= st.st_size if st.st_nlink <= 1 else 0
+                        _remove_file(path)
+                        cache_removed += 1
+                    else:
+                        usage -= self._reclaimable(path)
+                        remove_tree(path)
+                        evicted += 1
+            removed = self.sweep()
+            self.stats["compactions"] += 1
+            self.stats["expired"] += expired
+            self.stats["evicted"] += evicted
+            self.stats["cache_files_removed"] += cache_removed
+            self.stats["blobs_removed"] += removed
+            self.stats["last_compaction"] = round(now, 3)
+            if expired or evicted or cache_removed:
+                print(f"[INFO] store: expired {expired}, evicted {evicted}, removed {cache_removed} cached "
+                      f"files and {removed} blobs")
+            return {"expired": expired, "evicted": evicted, "cache_files_removed": cache_removed,
+                    "blobs_removed": removed}
+
+    def metrics(self) -> Dict:
+        blobs = sum(len(files) for _, _, files in os.walk(self.blobs))
+        return {
+            **self.stats,
+            "usage_bytes": self.usage(),
+            "quota_bytes": self.quota_bytes,
+            "ttl_s": self.ttl_s,
+            "sessions": len(self.sessions()),
+            "blobs": blobs,
+        }
+
+    def start_compactor(self, interval_s: float):
+        """Runs compact() every interval_s seconds on a daemon thread."""
+        if self._thread is not None or interval_s <= 0:
+            return
+        self._stop.clear()
+        def loop():
+            while not self._stop.wait(interval_s):
+                try:
+                    self.compact()
+                except Exception as e:  # keep the compactor alive
+                    print("[WARN] store compaction failed:", e)
+        self._thread = threading.Thread(target=loop, name="session-store-compactor", daemon=True)
+        self._thread.start()
+
+    def stop_compactor(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+_stores: Dict[str, SessionStore] = {}
+
+def get_store(root: str = "outputs", caches: Iterable[str] = ()) -> SessionStore:
+    """The store for `root`; `caches` are added to it (see SessionStore.add_cache)."""
+    store = _stores.get(root)
+    if store is None:
+        store = _stores[root] = SessionStore(
+            root,
+            quota_bytes=int(float(os.getenv("STORE_QUOTA_MB", "10240")) * 1024 * 1024),
+            ttl_s=float(os.getenv("SESSION_TTL_HOURS", "168")) * 3600,
+        )
+    for path in caches:
+        store.add_cache(path)
+    return store
@@ -0,0 +1,46 @@
+# backend/warmup.py
+"""Warms a process before it serves requests (see backend.serve --preload).
+
+Imports the lazily loaded rendering stack, builds the read-only tables the
+request path uses (part catalogs, PLI sprites, cost model coefficients) and runs
+one tiny pipeline end to end, so the first real request pays none of it. Done
+in the prefork parent, everything here is shared copy-on-write by the workers.
+"""
+import shutil
+import tempfile
+import time
+from typing import Dict
+
+def warm() -> Dict[str, float]:
+    """Returns seconds spent per warm-up step."""
+    timings: Dict[str, float] = {}
+
+    t0 = time.perf_counter()
+    from PIL import Image, ImageDraw, ImageFont, PngImagePlugin, PdfImagePlugin  # noqa: F401
+    ImageFont.load_default()
+    timings["imports"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    from .export.instructions import prerender_sprites
+    from .optimize.parts import CATALOGS, footprints
+    from .utils.cost_model import load_coeffs
+    for catalog in CATALOGS:
+        footprints(catalog)
+    sprites = prerender_sprites()
+    load_coeffs()
+    timings["tables"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    from .pipeline import run_pipeline
+    from .utils.spec_schema import DesignSpec
+    outdir = tempfile.mkdtemp(prefix="warmup_")
+    try:
+        # eager pages so the PNG and PDF encoders are exercised too
+        run_pipeline(DesignSpec(length_studs=8, width_studs=4, height_layers=2), outdir, batch_size=8)
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+    timings["pipeline"] = time.perf_counter() - t0
+
+    print(f"[TIMER] warm-up: imports {timings['imports']:.2f}s  tables {timings['tables']:.2f}s "
+          f"({sprites} sprites)  pipeline {timings['pipeline']:.2f}s")
+    return timings
@@ -0,0 +1,64 @@
+# scripts/bench_catalog.py
+"""Part count and stage timings per part catalog, versus the 4-plate baseline.
+
+    python scripts/bench_catalog.py [--prompts "spaceship 16 studs" "spaceship 64 studs" ...]
+"""
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.planners.prompt_parser import parse_prompt
+from backend.geometry.voxelizer import make_voxels
+from backend.optimize.greedy_packer import pack_greedy
+from backend.optimize.parts import CATALOGS, footprints
+from backend.planners.step_planner import plan_steps_connectivity_batched
+
+DEFAULT_PROMPTS = [
+    "spaceship 16 studs",
+    "spaceship 32 studs",
+    "spaceship 40 studs",
+    "house 24 studs",
+]
+
+def bench(prompt: str, catalog: str, batch_size: int):
+    spec = parse_prompt(prompt)
+    vox = make_voxels(spec)
+    t0 = time.perf_counter()
+    placements = pack_greedy(vox, seed=spec.seed, catalog=catalog)
+    t1 = time.perf_counter()
+    _, steps = plan_steps_connectivity_batched(placements, batch_size=batch_size, log_every=10**9)
+    t2 = time.perf_counter()
+    return {
+        "parts": len(placements),
+        "steps": steps,
+        "pack_s": round(t1 - t0, 4),
+        "plan_s": round(t2 - t1, 4),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--prompts", nargs="*", default=DEFAULT_PROMPTS)
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = ap.parse_args()
+
+    rows = []
+    for prompt in args.prompts:
+        base = None
+        for catalog in CATALOGS:
+            r = bench(prompt, catalog, args.batch_size)
+            r.update(prompt=prompt, catalog=catalog, footprints=len(footprints(catalog)))
+            base = base or r
+            r["parts_vs_basic"] = round(r["parts"] / base["parts"], 3) if base["parts"] else None
+            rows.append(r)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'prompt':<22} {'catalog':<7} {'fp':>3} {'parts':>6} {'ratio':>6} {'steps':>6} {'pack s':>7} {'plan s':>7}")
+    for r in rows:
+        print(f"{r['prompt']:<22} {r['catalog']:<7} {r['footprints']:>3} {r['parts']:>6} {r['parts_vs_basic']:>6} "
+              f"{r['steps']:>6} {r['pack_s']:>7.3f} {r['plan_s']:>7.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# scripts/bench_planner.py
+"""Step-planner scaling on tall models: batched vs layered (1..N workers).
+
+    python scripts/bench_planner.py [--heights 32 48 64] [--workers 1 2 4 8]
+"""
+import argparse, copy, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.geometry.voxelizer import make_voxels
+from backend.optimize.greedy_packer import pack_greedy
+from backend.planners.step_planner import plan_steps_connectivity_batched, plan_steps_layered
+from backend.utils.spec_schema import DesignSpec
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--heights", type=int, nargs="*", default=[32, 48, 64])
+    ap.add_argument("--length", type=int, default=32)
+    ap.add_argument("--width", type=int, default=16)
+    ap.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8])
+    ap.add_argument("--batch-size", type=int, default=8)
+    ap.add_argument("--skip-batched", action="store_true", help="skip the (slow) whole-model planner")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    rows = []
+    for h in args.heights:
+        spec = DesignSpec(category="spaceship", length_studs=args.length, width_studs=args.width, height_layers=h)
+        placements = pack_greedy(make_voxels(spec), seed=spec.seed)
+        base = dict(height=h, parts=len(placements), cpus=os.cpu_count())
+
+        if not args.skip_batched:
+            pl = copy.deepcopy(placements)
+            t0 = time.perf_counter()
+            _, steps = plan_steps_connectivity_batched(pl, batch_size=args.batch_size, log_every=0)
+            rows.append({**base, "planner": "batched", "workers": 1, "steps": steps,
+                         "seconds": round(time.perf_counter() - t0, 4)})
+
+        reference = None
+        for w in args.workers:
+            pl = copy.deepcopy(placements)
+            # the pool is started outside the timing, as a long-lived caller would own it
+            pool = ProcessPoolExecutor(max_workers=w) if w > 1 else None
+            if pool is not None:
+                list(pool.map(abs, range(w)))
+            t0 = time.perf_counter()
+            _, steps = plan_steps_layered(pl, batch_size=args.batch_size, executor=pool)
+            secs = time.perf_counter() - t0
+            if pool is not None:
+                pool.shutdown()
+            order = [p["step"] for p in pl]
+            reference = reference or order
+            rows.append({**base, "planner": "layered", "workers": w, "steps": steps,
+                         "seconds": round(secs, 4), "matches_serial": order == reference})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'height':>6} {'parts':>6} {'planner':<8} {'workers':>7} {'steps':>6} {'seconds':>8}  same-as-serial")
+    for r in rows:
+        print(f"{r['height']:>6} {r['parts']:>6} {r['planner']:<8} {r['workers']:>7} {r['steps']:>6} "
+              f"{r['seconds']:>8.3f}  {r.get('matches_serial', '')}")
+    print(f"(cpus: {os.cpu_count()})")
+
+if __name__ == "__main__":
+    main()
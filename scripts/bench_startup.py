@@ -0,0 +1,140 @@
+# scripts/bench_startup.py
+"""Cold-start benchmark: import time of backend.api, and time from process start
+to the first answered request, with and without --preload / prefork.
+
+    python scripts/bench_startup.py [--repeat 5] [--workers 2] [--json]
+
+Each server run starts `python -m backend.serve` in a fresh temp directory and
+measures: ready (first /healthz answer), the first /from_prompt and first step
+page latencies, and the same for a second request. For prefork runs the
+workers' RSS and the part of it shared with the parent are read from /proc.
+"""
+import argparse, json, os, shutil, socket, statistics, subprocess, sys, tempfile, time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["PIL", "ortools", "pandas"]   # should stay out of sys.modules at import
+PROMPT = {"prompt": "red spaceship 16 studs", "seed": 42}
+
+_IMPORT_PROBE = (
+    "import sys, time, json; t = time.perf_counter(); import backend.api; "
+    "print(json.dumps({'seconds': time.perf_counter() - t, "
+    "'loaded': [m for m in %r if m in sys.modules]}))" % HEAVY
+)
+
+def measure_import(repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, text=True)
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    secs = [r["seconds"] for r in runs]
+    return {"median_s": round(statistics.median(secs), 4), "min_s": round(min(secs), 4),
+            "heavy_modules_loaded": runs[-1]["loaded"]}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _request(url, body=None, timeout=120):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        payload = r.read()
+    return time.perf_counter() - t0, payload
+
+def _proc_kb(pid, field, path="smaps_rollup"):
+    try:
+        with open(f"/proc/{pid}/{path}") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            return [int(p) for p in fh.read().split()]
+    except OSError:
+        return []
+
+def measure_server(workers, preload):
+    port = _free_port()
+    cwd = tempfile.mkdtemp(prefix="bench_startup_")
+    cmd = [sys.executable, "-m", "backend.serve", "--port", str(port), "--workers", str(workers),
+           "--log-level", "warning"] + (["--preload"] if preload else [])
+    # no compactor process, so every child of a prefork server is a worker
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+           "STORE_COMPACT_INTERVAL_S": "0"}
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {proc.returncode}")
+            try:
+                _request(base + "/healthz", timeout=1)
+                break
+            except OSError:
+                time.sleep(0.02)
+        ready = time.perf_counter() - t0
+        row = {"workers": workers, "preload": preload, "ready_s": round(ready, 3)}
+        for n in ("first", "second"):
+            secs, payload = _request(base + "/from_prompt", dict(PROMPT, seed=PROMPT["seed"] + (n == "second")))
+            session = json.loads(payload)["session"]
+            row[f"{n}_prompt_s"] = round(secs, 4)
+            row[f"{n}_page_s"] = round(_request(f"{base}/sessions/{session}/steps/0.png?prefetch=0")[0], 4)
+        row["time_to_first_response_s"] = round(ready + row["first_prompt_s"], 3)
+        kids = _children(proc.pid)
+        if kids:
+            rss = [_proc_kb(k, "Rss") for k in kids]
+            shared = [(_proc_kb(k, "Shared_Clean") or 0) + (_proc_kb(k, "Shared_Dirty") or 0) for k in kids]
+            if all(v is not None for v in rss):
+                row["worker_rss_mb"] = round(statistics.mean(rss) / 1024, 1)
+                row["worker_shared_mb"] = round(statistics.mean(shared) / 1024, 1)
+        else:
+            rss = _proc_kb(proc.pid, "Rss")
+            row["worker_rss_mb"] = round(rss / 1024, 1) if rss else None
+        return row
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(cwd, ignore_errors=True)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5, help="import-time samples")
+    ap.add_argument("--workers", type=int, default=2, help="workers for the prefork run")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    report = {"cpus": os.cpu_count(), "import": measure_import(args.repeat), "servers": []}
+    configs = [(1, False), (1, True)]
+    if hasattr(os, "fork") and args.workers > 1:
+        configs.append((args.workers, True))
+    for workers, preload in configs:
+        report["servers"].append(measure_server(workers, preload))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    imp = report["import"]
+    print(f"import backend.api: median {imp['median_s']:.3f}s (min {imp['min_s']:.3f}s); "
+          f"heavy modules loaded: {imp['heavy_modules_loaded'] or 'none'}")
+    print(f"{'workers':>7} {'preload':>7} {'ready':>7} {'1st req':>8} {'1st page':>9} "
+          f"{'2nd req':>8} {'2nd page':>9} {'TTFR':>7} {'rss MB':>7} {'shared':>7}")
+    for r in report["servers"]:
+        print(f"{r['workers']:>7} {str(r['preload']):>7} {r['ready_s']:>7.3f} {r['first_prompt_s']:>8.4f} "
+              f"{r['first_page_s']:>9.4f} {r['second_prompt_s']:>8.4f} {r['second_page_s']:>9.4f} "
+              f"{r['time_to_first_response_s']:>7.3f} {r.get('worker_rss_mb') or '':>7} {r.get('worker_shared_mb', ''):>7}")
+    print(f"(cpus: {os.cpu_count()})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# scripts/calibrate_cost.py
+"""Fits the cost model (backend/utils/cost_model.py) to measured runs on this
+machine and writes backend/utils/cost_calibration.json.
+
+    python scripts/calibrate_cost.py [--sizes 12 16 24 32] [--ilp] [--dry-run]
+
+Each coefficient group is refitted by non-negative least squares through the
+origin on the features it already uses. The memory model and the lazy render
+cost are not fitted; their DEFAULT_COEFFS values stay in effect.
+"""
+import argparse, json, os, shutil, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from backend.pipeline import run_pipeline
+from backend.utils import cost_model
+from backend.utils.spec_schema import DesignSpec
+
+def _runs(sizes, catalogs, planners, solvers, batch_sizes):
+    for n in sizes:
+        for category in ("spaceship", "box"):
+            for catalog in catalogs:
+                for planner in planners:
+                    for solver in solvers:
+                        for batch in batch_sizes:
+                            yield dict(n=n, category=category, catalog=catalog, planner=planner,
+                                       solver=solver, batch_size=batch)
+
+def _measure(run, workdir, max_memory_mb):
+    n = run["n"]
+    spec = DesignSpec(category=run["category"], length_studs=n, width_studs=max(4, n // 2),
+                      height_layers=max(3, n // 3))
+    opts = dict(batch_size=run["batch_size"], catalog=run["catalog"], planner=run["planner"], solver=run["solver"])
+    # the PDF stitch holds every page in memory; skip it where the model says it will not fit
+    est = cost_model.estimate(spec, pages="eager", **opts)
+    stop_after = "render" if est["memory_mb"] > max_memory_mb else None
+    outdir = tempfile.mkdtemp(dir=workdir)
+    t0 = time.perf_counter()
+    result = run_pipeline(spec, outdir, stop_after=stop_after, **opts)
+    wall = time.perf_counter() - t0
+    shutil.rmtree(outdir, ignore_errors=True)
+    c = result["counts"]
+    H, W, L = spec.height_layers, spec.width_studs, spec.length_studs
+    f = cost_model._features(H, W, L, c["studs"], c["placements"], c["steps"], c["steps"], run["catalog"],
+                             run["batch_size"], shaped=run["category"] in cost_model.SHAPED)
+    print(f"[INFO] {run['category']:<9} n={n:<3} {run['catalog']:<6} {run['planner']:<7} {run['solver']:<6} "
+          f"b={run['batch_size']:<2} parts={c['placements']:<5} steps={c['steps']:<4} {wall:.2f}s")
+    return {**run, "grid": [H, W, L], "counts": c, "timings": result["timings"], "features": f}
+
+def _fit(rows, names, target):
+    X = np.array([[r["features"].get(k, 0.0) for k in names] for r in rows], dtype=float)
+    y = np.array([target(r) for r in rows], dtype=float)
+    # least squares, then drop negative terms and refit on the rest
+    active = list(range(len(names)))
+    coef = np.zeros(len(names))
+    while active:
+        sol, *_ = np.linalg.lstsq(X[:, active], y, rcond=None)
+        if (sol >= 0).all():
+            coef[active] = sol
+            break
+        active = [a for a, v in zip(active, sol) if v > 0]
+    return {k: float(f"{v:.4g}") for k, v in zip(names, coef)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="*", default=[12, 16, 24, 32])
+    ap.add_argument("--catalogs", nargs="*", default=["basic", "plates", "full"])
+    ap.add_argument("--planners", nargs="*", default=["batched", "layered"])
+    ap.add_argument("--batch-sizes", type=int, nargs="*", default=[4, 8, 16])
+    ap.add_argument("--max-memory-mb", type=float, default=2048,
+                    help="skip the PDF stage for runs estimated above this")
+    ap.add_argument("--ilp", action="store_true", help="also time the CP-SAT packer (slow)")
+    ap.add_argument("--dry-run", action="store_true", help="print the fit instead of writing it")
+    args = ap.parse_args()
+
+    solvers = ["greedy", "ilp"] if args.ilp else ["greedy"]
+    workdir = tempfile.mkdtemp(prefix="calibrate_")
+    try:
+        rows = [_measure(r, workdir, args.max_memory_mb) for r in _runs(args.sizes, args.catalogs, args.planners,
+                                                     solvers, args.batch_sizes)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = cost_model.DEFAULT_COEFFS
+    coeffs = {"fill": {}, "placements": {}}
+    spaceship = [r for r in rows if r["category"] == "spaceship"]
+    coeffs["fill"]["spaceship"] = round(float(np.mean(
+        [r["counts"]["studs"] / np.prod(r["grid"]) for r in spaceship])), 4)
+    for cat in args.catalogs:
+        sub = [r for r in rows if r["catalog"] == cat and r["solver"] == "greedy"]
+        coeffs["placements"].update(_fit(sub, [f"voxels_{cat}", f"shaped_voxels_{cat}"],
+                                         lambda r: r["counts"]["placements"]))
+    coeffs["steps"] = _fit(rows, list(base["steps"]), lambda r: r["counts"]["steps"])
+
+    def stage(name):
+        return lambda r: r["timings"].get(name, 0.0)
+    greedy = [r for r in rows if r["solver"] == "greedy"]
+    # only the spaceship voxelizer does real work; boxes are a single fill
+    coeffs["voxelize"] = _fit(spaceship, list(base["voxelize"]), stage("voxelize"))
+    coeffs["pack_greedy"] = _fit(greedy, list(base["pack_greedy"]), stage("pack"))
+    if args.ilp:
+        coeffs["pack_ilp"] = _fit([r for r in rows if r["solver"] == "ilp"], list(base["pack_ilp"]), stage("pack"))
+    for planner in args.planners:
+        sub = [r for r in rows if r["planner"] == planner]
+        coeffs[f"plan_{planner}"] = _fit(sub, list(base[f"plan_{planner}"]), stage("plan"))
+    coeffs["ldraw"] = _fit(rows, list(base["ldraw"]), stage("ldraw"))
+    coeffs["bom"] = _fit(rows, list(base["bom"]), stage("bom"))
+    coeffs["render_eager"] = _fit(rows, list(base["render_eager"]), stage("render"))
+    coeffs["pdf"] = _fit([r for r in rows if "pdf" in r["timings"]], list(base["pdf"]), stage("pdf"))
+
+    # no timestamp: rerunning on the same data must not change the file
+    out = {
+        "cpus": os.cpu_count(),
+        "runs": len(rows),
+        "coeffs": coeffs,
+    }
+    if args.dry_run:
+        print(json.dumps(out, indent=2))
+        return
+    with open(cost_model.CALIBRATION_PATH, "w", encoding="utf-8") as fh:
+        json.dump(out, fh, indent=2)
+        fh.write("\n")
+    print(f"[INFO] wrote {cost_model.CALIBRATION_PATH}")
+
+if __name__ == "__main__":
+    main()
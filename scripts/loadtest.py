@@ -0,0 +1,344 @@
+# scripts/loadtest.py
+"""Load test for /from_prompt: replays a weighted prompt mix against the app and
+writes a JSON report (latency percentiles, throughput, errors, RSS over time).
+
+    python scripts/loadtest.py --concurrency 4 --duration 30
+    python scripts/loadtest.py --rps 2 --duration 60 --mode uvicorn --report after.json
+    python scripts/loadtest.py --compare before.json after.json
+
+--mode inprocess (default) drives the ASGI app directly through httpx; --mode
+uvicorn starts this script with --serve as a separate server process on
+localhost. External pieces are stubbed so runs are offline and repeatable:
+LPub3D is replaced by scripts/lpub3d_stub.py (--lpub-delay seconds per render,
+unless --real-lpub3d), and --parse-latency-ms adds a fixed delay to prompt
+parsing to stand in for a remote (LLM) parser. Outputs go to a temp directory
+that is removed afterwards unless --keep-outputs.
+
+RSS is sampled from the server process in uvicorn mode. In inprocess mode it is
+the load generator's own process, which also runs the app; the report says
+which in "rss_of". Needs httpx (in requirements.txt).
+
+With --rps the load is open-loop: requests start on a fixed schedule whether or
+not earlier ones finished, and latency is measured from the scheduled start.
+With --concurrency, N clients each send their next request when the last returns.
+"""
+import argparse, asyncio, contextlib, json, os, random, shutil, socket, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+# (weight, label, request body)
+DEFAULT_MIX = [
+    (4, "small", {"prompt": "sleek red micro spaceship, ~16 studs long", "seed": 42}),
+    (3, "medium", {"prompt": "blue spaceship 24 studs", "seed": 7}),
+    (2, "box", {"prompt": "yellow car 20 studs", "seed": 1}),
+    (1, "large", {"prompt": "black spaceship 40 studs", "seed": 3}),
+    (1, "lpub3d", {"prompt": "red spaceship 16 studs", "seed": 42, "lpub3d": True}),
+]
+
+def load_mix(path):
+    """JSONL of {"weight", "label", "body"}, or a bare request body per line."""
+    if not path:
+        return DEFAULT_MIX
+    mix = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for i, line in enumerate(fh):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = item.get("body", item)
+            mix.append((float(item.get("weight", 1)), item.get("label", f"line{i + 1}"), body))
+    return mix
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 1)
+    except OSError:
+        pass
+    if pid == os.getpid():   # no procfs: peak RSS is the best we have
+        try:
+            import resource   # POSIX only
+        except ImportError:
+            return None
+        scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+    return None
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _stub_env(args, outputs):
+    env = {"LPUB3D_CACHE_DIR": os.path.join(outputs, ".lpub_cache")}
+    if not args.real_lpub3d:
+        env["LPUB3D_EXE"] = os.path.join(ROOT, "scripts", "lpub3d_stub.py")
+        env["LPUB3D_STUB_DELAY"] = str(args.lpub_delay)
+    return env
+
+def configure_app(outputs, parse_latency_ms):
+    """Point the app at `outputs` and apply the parse stub; returns the app."""
+    from backend import api
+    api.OUTPUTS = outputs
+    if parse_latency_ms > 0:
+        parse = api.parse_prompt
+        def slow_parse(prompt):
+            time.sleep(parse_latency_ms / 1000.0)
+            return parse(prompt)
+        api.parse_prompt = slow_parse
+    return api.app
+
+def serve(args):
+    import uvicorn
+    app = configure_app(args.outputs, args.parse_latency_ms)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _wait_ready(client, proc, timeout_s=60.0):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if (await client.get("/admission/metrics")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+class Recorder:
+    def __init__(self, pid):
+        self.pid = pid
+        self.t0 = time.perf_counter()
+        self.results = []    # (label, status, latency_s, finished_at)
+        self.timeline = []
+        self.inflight = 0
+
+    def record(self, label, status, latency_s):
+        self.results.append((label, status, latency_s, time.perf_counter() - self.t0))
+
+    async def sample(self, interval_s):
+        while True:
+            self.timeline.append({
+                "t": round(time.perf_counter() - self.t0, 2),
+                "rss_mb": _rss_mb(self.pid),
+                "inflight": self.inflight,
+                "completed": len(self.results),
+            })
+            await asyncio.sleep(interval_s)
+
+async def _send(client, rec, label, body, timeout_s, started=None):
+    started = time.perf_counter() if started is None else started
+    rec.inflight += 1
+    try:
+        r = await client.post("/from_prompt", json=body, timeout=timeout_s)
+        status = str(r.status_code)
+    except Exception as e:
+        status = f"exception:{type(e).__name__}"
+    finally:
+        rec.inflight -= 1
+    rec.record(label, status, time.perf_counter() - started)
+
+async def run_open_loop(client, rec, mix, rps, duration, timeout_s, rng):
+    weights = [m[0] for m in mix]
+    tasks, i = [], 0
+    start = time.perf_counter()
+    while True:
+        due = start + i / rps
+        if due - start >= duration:
+            break
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        _, label, body = rng.choices(mix, weights)[0]
+        tasks.append(asyncio.create_task(_send(client, rec, label, body, timeout_s, started=due)))
+        i += 1
+    await asyncio.gather(*tasks)
+
+async def run_closed_loop(client, rec, mix, concurrency, duration, timeout_s, rng):
+    weights = [m[0] for m in mix]
+    stop = time.perf_counter() + duration
+    async def worker():
+        while time.perf_counter() < stop:
+            _, label, body = rng.choices(mix, weights)[0]
+            await _send(client, rec, label, body, timeout_s)
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+def _latency(values):
+    if not values:
+        return None
+    ms = np.asarray(values) * 1000.0
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p95": round(float(np.percentile(ms, 95)), 1),
+        "p99": round(float(np.percentile(ms, 99)), 1),
+        "mean": round(float(ms.mean()), 1),
+        "max": round(float(ms.max()), 1),
+    }
+
+def summarize(results, wall_s):
+    ok = [r for r in results if r[1].startswith("2")]
+    statuses = {}
+    for r in results:
+        statuses[r[1]] = statuses.get(r[1], 0) + 1
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "status_counts": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(ok) / wall_s, 3) if wall_s else 0.0,
+        "latency_ms": _latency([r[2] for r in ok]),
+    }
+
+async def run(args, mix):
+    import httpx
+    outputs = args.outputs
+    rng = random.Random(args.seed)
+    proc = None
+    if args.mode == "uvicorn":
+        port = args.port or _free_port()
+        cmd = [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port),
+               "--outputs", outputs, "--parse-latency-ms", str(args.parse_latency_ms)]
+        quiet = None if args.verbose else subprocess.DEVNULL
+        proc = subprocess.Popen(cmd, env={**os.environ, **_stub_env(args, outputs)}, cwd=ROOT, stdout=quiet)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout)
+        pid = proc.pid
+    else:
+        os.environ.update(_stub_env(args, outputs))
+        app = configure_app(outputs, args.parse_latency_ms)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest",
+                                   timeout=args.timeout)
+        pid = os.getpid()
+
+    try:
+        if proc is not None:
+            await _wait_ready(client, proc)
+        for _, label, body in mix[:args.warmup]:
+            await client.post("/from_prompt", json=body)
+        rec = Recorder(pid)
+        sampler = asyncio.create_task(rec.sample(args.sample_interval))
+        t0 = time.perf_counter()
+        if args.rps:
+            await run_open_loop(client, rec, mix, args.rps, args.duration, args.timeout, rng)
+        else:
+            await run_closed_loop(client, rec, mix, args.concurrency, args.duration, args.timeout, rng)
+        wall = time.perf_counter() - t0
+        sampler.cancel()
+        admission = (await client.get("/admission/metrics")).json()
+        lpub = (await client.get("/lpub3d/metrics")).json()
+    finally:
+        await client.aclose()
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    rss = [s["rss_mb"] for s in rec.timeline if s["rss_mb"] is not None]
+    labels = sorted({m[1] for m in mix})
+    return {
+        "version": _git_rev(),
+        "config": {
+            "mode": args.mode, "rps": args.rps, "concurrency": None if args.rps else args.concurrency,
+            "duration_s": args.duration, "seed": args.seed, "cpus": os.cpu_count(),
+            "stubs": {"lpub3d": None if args.real_lpub3d else args.lpub_delay,
+                      "parse_latency_ms": args.parse_latency_ms},
+            "mix": [{"weight": w, "label": label, "body": body} for w, label, body in mix],
+        },
+        "summary": {**summarize(rec.results, wall), "wall_s": round(wall, 2)},
+        "by_label": {label: summarize([r for r in rec.results if r[0] == label], wall) for label in labels},
+        "rss_mb": {"start": rss[0], "peak": max(rss), "end": rss[-1]} if rss else None,
+        # inprocess mode has no separate server: the app shares the load generator's process
+        "rss_of": "server" if args.mode == "uvicorn" else "loadgen+app",
+        "server": {"admission": admission, "lpub3d": lpub},
+        "timeline": rec.timeline,
+    }
+
+def _flatten(d, prefix=""):
+    out = {}
+    for k, v in (d or {}).items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+def compare(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as fh:
+        old = json.load(fh)
+    with open(new_path, "r", encoding="utf-8") as fh:
+        new = json.load(fh)
+    print(f"{old.get('version')} -> {new.get('version')}")
+    if old.get("rss_of") != new.get("rss_of"):
+        print(f"  note: RSS measured on different processes ({old.get('rss_of')} vs {new.get('rss_of')})")
+    a = _flatten({"summary": old["summary"], "by_label": old.get("by_label"), "rss_mb": old.get("rss_mb")})
+    b = _flatten({"summary": new["summary"], "by_label": new.get("by_label"), "rss_mb": new.get("rss_mb")})
+    for key in sorted(set(a) | set(b)):
+        x, y = a.get(key), b.get(key)
+        if x == y:
+            continue
+        change = f"{(y - x) / x * 100:+.1f}%" if x and y is not None else ""
+        print(f"  {key:<42} {x!s:>10} -> {y!s:<10} {change}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    load = ap.add_mutually_exclusive_group()
+    load.add_argument("--rps", type=float, help="open-loop request rate")
+    load.add_argument("--concurrency", type=int, default=4, help="closed-loop clients (default)")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    ap.add_argument("--prompts", help="JSONL prompt mix (default: built-in mix)")
+    ap.add_argument("--warmup", type=int, default=1, help="requests sent before measuring")
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--seed", type=int, default=0, help="seed for the prompt choice")
+    ap.add_argument("--sample-interval", type=float, default=0.5, help="seconds between RSS samples")
+    ap.add_argument("--lpub-delay", type=float, default=1.0, help="stub LPub3D render seconds")
+    ap.add_argument("--real-lpub3d", action="store_true", help="use the configured LPub3D, not the stub")
+    ap.add_argument("--parse-latency-ms", type=float, default=0.0, help="simulated remote parser latency")
+    ap.add_argument("--report", default="loadtest_report.json")
+    ap.add_argument("--outputs", help="session outputs directory (default: a temp dir)")
+    ap.add_argument("--keep-outputs", action="store_true")
+    ap.add_argument("--verbose", action="store_true", help="show the pipeline's own logging")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two reports and exit")
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.serve:
+        serve(args)
+        return
+
+    tmp = None
+    if not args.outputs:
+        tmp = args.outputs = tempfile.mkdtemp(prefix="loadtest_")
+    try:
+        with open(os.devnull, "w") as devnull:
+            # the pipeline logs every stage with print(); keep the console readable
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                report = asyncio.run(run(args, load_mix(args.prompts)))
+    finally:
+        if tmp and not args.keep_outputs:
+            shutil.rmtree(tmp, ignore_errors=True)
+    with open(args.report, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    s = report["summary"]
+    lat = s["latency_ms"] or {}
+    print(f"[INFO] {s['requests']} requests, {s['ok']} ok, error rate {s['error_rate']:.1%}, "
+          f"{s['throughput_rps']} req/s; p50 {lat.get('p50')} ms, p95 {lat.get('p95')} ms, "
+          f"p99 {lat.get('p99')} ms; peak RSS ({report['rss_of']}) {(report['rss_mb'] or {}).get('peak')} MB")
+    print(f"[INFO] report: {args.report}")
+
+if __name__ == "__main__":
+    main()
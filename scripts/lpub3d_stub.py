@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# scripts/lpub3d_stub.py
+"""Stand-in for the LPub3D executable, for offline load tests:
+
+    LPUB3D_EXE=scripts/lpub3d_stub.py  (called as: <model.ldr> -o <out.pdf> [-l <ldraw dir>])
+
+Sleeps LPUB3D_STUB_DELAY seconds (default 1.0) to mimic a render, then writes a
+one-page placeholder PDF. LPUB3D_STUB_FAIL=1 makes it exit with an error instead.
+"""
+import os, sys, time
+
+_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+        b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+        b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+        b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+def main(argv):
+    if "-o" not in argv or argv.index("-o") + 1 >= len(argv):
+        print("usage: lpub3d_stub.py <model.ldr> -o <out.pdf>", file=sys.stderr)
+        return 2
+    out = argv[argv.index("-o") + 1]
+    time.sleep(float(os.getenv("LPUB3D_STUB_DELAY", "1.0")))
+    if os.getenv("LPUB3D_STUB_FAIL") == "1":
+        print("stub failure requested", file=sys.stderr)
+        return 1
+    with open(out, "wb") as fh:
+        fh.write(_PDF)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,81 @@
+# tests/test_admission.py
+import asyncio
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import api
+from backend.utils import admission
+from backend.utils.admission import AdmissionController, AdmissionRejected
+from backend.utils.cost_model import estimate_grid
+
+def _est(seconds, memory_mb=100.0):
+    return {"total_seconds": seconds, "memory_mb": memory_mb}
+
+def test_routing_by_estimate():
+    ctl = AdmissionController(max_seconds=60, max_memory_mb=1000, heavy_seconds=5)
+    assert ctl.decide(_est(1))["route"] == "light"
+    assert ctl.decide(_est(10))["route"] == "heavy"
+    assert ctl.decide(_est(61))["route"] == "reject"
+    assert ctl.decide(_est(1, memory_mb=2000))["route"] == "reject"
+    with pytest.raises(AdmissionRejected) as e:
+        ctl.admit(_est(61))
+    assert e.value.status == 413 and ctl.stats["rejected_budget"] == 1
+
+def test_estimates_grow_with_the_grid():
+    small, large = estimate_grid(4, 8, 8), estimate_grid(32, 64, 64, pages="eager")
+    assert small["total_seconds"] < large["total_seconds"]
+    assert small["memory_mb"] < large["memory_mb"]
+    assert small["pages"] == 0 and large["pages"] == large["steps"]
+
+def test_light_runs_in_process_and_heavy_in_a_started_process():
+    ctl = AdmissionController(heavy_seconds=5)
+    try:
+        async def go():
+            light = await ctl.run(ctl.admit(_est(1)), os.getpid)
+            heavy = await ctl.run(ctl.admit(_est(10)), os.getpid)
+            return light, heavy
+        light, heavy = asyncio.run(go())
+        assert light == os.getpid() and heavy != os.getpid()
+        assert ctl._pool._mp_context.get_start_method() in ("forkserver", "spawn")
+    finally:
+        ctl.shutdown()
+
+def test_full_heavy_queue_is_a_429():
+    ctl = AdmissionController(heavy_seconds=5, heavy_workers=1, heavy_queue=0)
+    try:
+        async def go():
+            decision = ctl.admit(_est(10))
+            first = asyncio.ensure_future(ctl.run(decision, time.sleep, 0.5))
+            await asyncio.sleep(0.05)
+            with pytest.raises(AdmissionRejected) as e:
+                await ctl.run(decision, time.sleep, 0)
+            await first
+            return e.value.status
+        assert asyncio.run(go()) == 429
+        assert ctl.stats["rejected_busy"] == 1
+    finally:
+        ctl.shutdown()
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "OUTPUTS", str(tmp_path / "outputs"))
+    monkeypatch.setattr(admission, "_controller", AdmissionController())
+    return TestClient(api.app)
+
+def test_prompt_is_parsed_once_per_request(client, monkeypatch):
+    calls = []
+    real = api.parse_prompt
+    monkeypatch.setattr(api, "parse_prompt", lambda text: calls.append(text) or real(text))
+    r = client.post("/from_prompt", json={"prompt": "red spaceship 8 studs long"})
+    assert r.status_code == 200, r.text
+    assert len(calls) == 1
+
+def test_over_budget_prompt_is_a_413_without_a_session(client, monkeypatch):
+    monkeypatch.setattr(admission, "_controller", AdmissionController(max_seconds=0.0))
+    r = client.post("/from_prompt", json={"prompt": "red spaceship 8 studs long"})
+    assert r.status_code == 413
+    assert r.json()["detail"]["estimate"]["total_seconds"] > 0
+    assert not os.path.isdir(api.OUTPUTS) or os.listdir(api.OUTPUTS) == []
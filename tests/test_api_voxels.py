@@ -0,0 +1,55 @@
+# tests/test_api_voxels.py
+import io
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import api
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "OUTPUTS", str(tmp_path / "outputs"))
+    return TestClient(api.app)
+
+def _sessions():
+    root = api.OUTPUTS
+    return [n for n in os.listdir(root) if n.startswith("session_")] if os.path.isdir(root) else []
+
+def _npy(grid):
+    buf = io.BytesIO()
+    np.save(buf, grid)
+    return buf.getvalue()
+
+def test_valid_grid_creates_a_session(client):
+    grid = np.ones((2, 4, 4), dtype=np.uint8)
+    r = client.post("/from_voxels?format=npy&pages=lazy", content=_npy(grid))
+    assert r.status_code == 200, r.text
+    assert _sessions() == [r.json()["session"]]
+
+@pytest.mark.parametrize("fmt,body", [
+    ("npz", b"PK\x03\x04 corrupt"),
+    ("npy", b"\x93NUMPY truncated"),
+    ("vox", b"VOX \x96\x00\x00\x00MAIN\x00\x00"),
+    ("npy", _npy(np.zeros((300, 2, 2), dtype=np.uint8))),
+])
+def test_unreadable_upload_is_a_400_and_leaves_nothing(client, fmt, body):
+    r = client.post(f"/from_voxels?format={fmt}", content=body)
+    assert r.status_code == 400, r.text
+    assert _sessions() == []
+
+def test_oversize_upload_is_a_413_and_leaves_nothing(client, monkeypatch):
+    monkeypatch.setattr(api, "MAX_VOXEL_UPLOAD", 64)
+    r = client.post("/from_voxels?format=npy", content=_npy(np.ones((2, 4, 4), dtype=np.uint8)))
+    assert r.status_code == 413
+    assert _sessions() == []
+
+def test_pipeline_failure_leaves_nothing(client, monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("pipeline crashed")
+    monkeypatch.setattr(api, "run_voxel_pipeline", boom)
+    client_500 = TestClient(api.app, raise_server_exceptions=False)
+    r = client_500.post("/from_voxels?format=npy", content=_npy(np.ones((2, 4, 4), dtype=np.uint8)))
+    assert r.status_code == 500
+    assert _sessions() == []
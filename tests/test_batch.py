@@ -0,0 +1,77 @@
+# tests/test_batch.py
+import json
+import re
+
+from backend.batch import completed_ids, main
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write((row if isinstance(row, str) else json.dumps(row)) + "\n")
+
+def test_completed_ids_needs_ok_status_and_a_late_enough_stage(tmp_path):
+    out = tmp_path / "results.jsonl"
+    _write_jsonl(out, [
+        {"id": "full", "status": "ok", "stop_after": None},
+        {"id": "packed", "status": "ok", "stop_after": "pack"},
+        {"id": "failed", "status": "error", "stop_after": None},
+        '{"id": "torn", "status": "o',   # interrupted mid-write
+    ])
+    assert completed_ids(str(out)) == {"full"}
+    assert completed_ids(str(out), stop_after="pack") == {"full", "packed"}
+    assert completed_ids(str(out), stop_after="voxelize") == {"full", "packed"}
+    assert completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+def test_rerun_skips_completed_items_and_resumes_the_rest(tmp_path):
+    items = tmp_path / "items.jsonl"
+    out = tmp_path / "results.jsonl"
+    spec = {"length_studs": 4, "width_studs": 4, "height_layers": 2}
+    _write_jsonl(items, [{"id": "a", "spec": spec}, {"id": "b", "spec": spec, "seed": 7}])
+    _write_jsonl(out, [{"id": "a", "status": "ok", "stop_after": "pack"}])
+    args = [str(items), str(out), "-j", "1", "--outputs", str(tmp_path / "outputs")]
+
+    assert main(args + ["--stop-after", "pack"]) == 0
+    recs = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [r["id"] for r in recs] == ["a", "b"]          # only "b" ran
+    assert set(recs[1]["timings"]) == {"voxelize", "pack"}
+
+    # asking for more stages reruns both; a second identical run is a no-op
+    assert main(args + ["--stop-after", "plan"]) == 0
+    assert main(args + ["--stop-after", "plan"]) == 0
+    recs = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [r["id"] for r in recs] == ["a", "b", "a", "b"]
+    assert all(r["status"] == "ok" for r in recs)
+
+def test_plan_workers_share_one_pool_and_match_serial(tmp_path):
+    items = tmp_path / "items.jsonl"
+    spec = {"length_studs": 8, "width_studs": 4, "height_layers": 3}
+    _write_jsonl(items, [{"id": "a", "spec": spec}, {"id": "b", "spec": spec, "seed": 3}])
+    steps = []
+    for n, extra in enumerate([[], ["--plan-workers", "2"]]):
+        out = tmp_path / f"results{n}.jsonl"
+        args = [str(items), str(out), "-j", "1", "--planner", "layered", "--stop-after", "plan",
+                "--outputs", str(tmp_path / f"outputs{n}")]
+        assert main(args + extra) == 0
+        steps.append([json.loads(line)["counts"] for line in out.read_text(encoding="utf-8").splitlines()])
+    assert steps[0] == steps[1]
+
+def _pdf_pages(path):
+    with open(path, "rb") as fh:
+        return len(re.findall(rb"/Type\s*/Page(?!s)", fh.read()))
+
+def test_rerun_with_fewer_steps_leaves_no_stale_pages(tmp_path):
+    items = tmp_path / "items.jsonl"
+    outputs = tmp_path / "outputs"
+    spec = {"length_studs": 12, "width_studs": 6, "height_layers": 3}
+    counts = []
+    for n, catalog in enumerate(["basic", "full"]):
+        out = tmp_path / f"results{n}.jsonl"
+        _write_jsonl(items, [{"id": "a", "spec": spec, "catalog": catalog}])
+        assert main([str(items), str(out), "-j", "1", "--outputs", str(outputs)]) == 0
+        counts.append(json.loads(out.read_text(encoding="utf-8"))["counts"]["steps"])
+    assert counts[1] < counts[0]
+    outdir = outputs / "a"
+    pngs = list((outdir / "instructions" / "steps").glob("step_*.png"))
+    assert len(pngs) == counts[1]
+    assert len(list(outdir.glob("**/step_*.ldr"))) == counts[1]
+    assert _pdf_pages(outdir / "instructions.pdf") == counts[1]
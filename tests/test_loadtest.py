@@ -0,0 +1,25 @@
+# tests/test_loadtest.py
+import builtins
+import os
+import sys
+
+from scripts import loadtest
+
+def test_summarize_counts_statuses_and_latency():
+    results = [("small", "200", 0.1, 0.0), ("small", "200", 0.3, 0.1), ("large", "429", 0.01, 0.2)]
+    s = loadtest.summarize(results, wall_s=2.0)
+    assert s["requests"] == 3 and s["ok"] == 2
+    assert s["status_counts"] == {"200": 2, "429": 1}
+    assert s["throughput_rps"] == 1.0
+    assert s["latency_ms"]["max"] == 300.0
+
+def test_rss_without_procfs_or_resource_module(monkeypatch):
+    real_open = builtins.open
+    def no_proc(path, *args, **kwargs):
+        if str(path).startswith("/proc/"):
+            raise OSError("no procfs")
+        return real_open(path, *args, **kwargs)
+    monkeypatch.setattr(builtins, "open", no_proc)
+    monkeypatch.setitem(sys.modules, "resource", None)   # as on Windows
+    assert loadtest._rss_mb(os.getpid()) is None
+    assert loadtest._rss_mb(os.getpid() + 1) is None
@@ -0,0 +1,70 @@
+# tests/test_lpub_runner.py
+import asyncio
+import os
+import sys
+
+import pytest
+
+from backend.export import lpub_runner
+from backend.export.lpub_runner import LPubRunner, model_hash
+
+STUB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "lpub3d_stub.py")
+
+@pytest.fixture
+def stub(monkeypatch):
+    if sys.platform == "win32":
+        pytest.skip("the stub is run as an executable script")
+    monkeypatch.setenv("LPUB3D_EXE", STUB)
+    monkeypatch.setenv("LPUB3D_STUB_DELAY", "0.2")
+
+def _model(dirpath, body="0 model\n"):
+    os.makedirs(dirpath, exist_ok=True)
+    path = os.path.join(dirpath, "model.ldr")
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(body)
+    return path
+
+def test_model_hash_covers_referenced_subfiles(tmp_path):
+    top = _model(str(tmp_path), "1 16 0 0 0 1 0 0 0 1 0 0 0 1 step_1.ldr\n")
+    (tmp_path / "step_1.ldr").write_text("a", encoding="utf-8")
+    before = model_hash(top)
+    (tmp_path / "step_1.ldr").write_text("b", encoding="utf-8")
+    assert model_hash(top) != before
+
+def test_identical_models_render_once_and_hit_the_cache(tmp_path, stub):
+    runner = LPubRunner(cache_dir=str(tmp_path / "cache"))
+    models = [_model(str(tmp_path / f"s{i}")) for i in range(3)]
+
+    async def go():
+        first = await asyncio.gather(*(runner.render(m, os.path.dirname(m)) for m in models[:2]))
+        again = await runner.render(models[2], os.path.dirname(models[2]))
+        return first, again
+
+    first, again = asyncio.run(go())
+    assert all(p and os.path.isfile(p) for p in first + [again])
+    assert runner.stats["completed"] == 1
+    assert runner.stats["cache_hits"] == 2
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def test_file_io_runs_off_the_event_loop(tmp_path, stub, monkeypatch):
+    calls = []
+    real_hash, real_link = lpub_runner.model_hash, lpub_runner.link_or_copy
+    monkeypatch.setattr(lpub_runner, "model_hash", lambda p: calls.append(_on_event_loop()) or real_hash(p))
+    monkeypatch.setattr(lpub_runner, "link_or_copy", lambda s, d: calls.append(_on_event_loop()) or real_link(s, d))
+    runner = LPubRunner(cache_dir=str(tmp_path / "cache"))
+    model = _model(str(tmp_path / "s"))
+    assert asyncio.run(runner.render(model, str(tmp_path / "s")))
+    assert calls == [False, False]
+
+def test_failed_render_returns_none(tmp_path, stub, monkeypatch):
+    monkeypatch.setenv("LPUB3D_STUB_FAIL", "1")
+    runner = LPubRunner(cache_dir=str(tmp_path / "cache"))
+    model = _model(str(tmp_path / "s"))
+    assert asyncio.run(runner.render(model, str(tmp_path / "s"))) is None
+    assert runner.stats["failed"] == 1
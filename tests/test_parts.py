@@ -0,0 +1,27 @@
+# tests/test_parts.py
+import numpy as np
+import pytest
+
+from backend.optimize.greedy_packer import pack_greedy
+from backend.optimize.parts import BASIC, CATALOGS, DEFAULT_CATALOG, footprints
+
+def test_default_catalog_is_the_original_four_plates():
+    assert DEFAULT_CATALOG == "basic"
+    fps = footprints()
+    assert sorted(p["ldraw"] for p in fps) == sorted(BASIC)
+    assert all(p["rot"] == 0 and p["h"] == 1 for p in fps)
+
+def test_basic_packing_matches_the_original_packer():
+    grid = np.ones((2, 4, 5), dtype=np.uint8)
+    got = [(p["z"], p["y"], p["x"], p["w"], p["l"], p["ldraw"]) for p in pack_greedy(grid)]
+    # per layer: 2x4 plates first; no rotations, so the leftover column is 1x1s
+    layer = [(0, 0, 2, 4, "3020.dat"), (2, 0, 2, 4, "3020.dat")] + [(y, 4, 1, 1, "3024.dat") for y in range(4)]
+    assert sorted(got) == sorted((z,) + cell for z in range(2) for cell in layer)
+
+@pytest.mark.parametrize("catalog", CATALOGS)
+def test_every_catalog_covers_a_solid_grid(catalog):
+    grid = np.ones((3, 6, 7), dtype=np.uint8)
+    covered = np.zeros_like(grid)
+    for p in pack_greedy(grid, catalog=catalog):
+        covered[p["z"]:p["z"] + p.get("h", 1), p["y"]:p["y"] + p["w"], p["x"]:p["x"] + p["l"]] += 1
+    assert (covered == grid).all()
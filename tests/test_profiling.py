@@ -0,0 +1,59 @@
+# tests/test_profiling.py
+import json
+import os
+import pstats
+
+import pytest
+
+from backend import pipeline
+from backend.utils.profiling import StageProfiler
+from backend.utils.spec_schema import DesignSpec
+
+@pytest.fixture(autouse=True)
+def cprofile_backend(monkeypatch):
+    monkeypatch.setenv("PROFILER", "cprofile")
+
+def test_cprofile_stage_writes_artifact_and_index(tmp_path):
+    prof = StageProfiler(str(tmp_path))
+    with prof.stage("work"):
+        sum(i * i for i in range(1000))
+    index = json.loads(open(prof.write_index(), encoding="utf-8").read())
+    assert index["backend"] == "cprofile"
+    assert index["sampling"] is False and index["interval_s"] is None
+    assert os.path.isfile(index["stages"]["work"]["artifact"])
+
+def test_concurrent_cprofile_stage_is_skipped_not_raised(tmp_path):
+    outer, inner = StageProfiler(str(tmp_path / "a")), StageProfiler(str(tmp_path / "b"))
+    with outer.stage("outer"):
+        with inner.stage("inner"):
+            pass
+    assert "artifact" in outer.stages["outer"]
+    assert inner.stages["inner"]["skipped"]
+    # the lock is released again afterwards
+    with inner.stage("again"):
+        pass
+    assert "artifact" in inner.stages["again"]
+
+def test_index_is_written_when_a_stage_raises(tmp_path, monkeypatch):
+    def boom(*args, **kwargs):
+        raise RuntimeError("packer crashed")
+    monkeypatch.setattr(pipeline, "pack_greedy", boom)
+    spec = DesignSpec(length_studs=4, width_studs=4, height_layers=2)
+    with pytest.raises(RuntimeError):
+        pipeline.run_pipeline(spec, str(tmp_path), profile=True)
+    index = json.loads((tmp_path / "profile" / "profile.json").read_text(encoding="utf-8"))
+    assert set(index["stages"]) == {"voxelize", "pack"}
+
+def test_rerun_replaces_profiles_instead_of_writing_through_links(tmp_path):
+    prof = StageProfiler(str(tmp_path))
+    with prof.stage("work"):
+        sum(range(10))
+    path = prof.stages["work"]["artifact"]
+    shared = str(tmp_path / "blob")
+    os.link(path, shared)   # as after a store commit
+    before = open(shared, "rb").read()
+    with StageProfiler(str(tmp_path)).stage("work"):
+        sorted(str(i) for i in range(1000))
+    assert open(shared, "rb").read() == before
+    assert not os.path.samefile(path, shared)
+    assert pstats.Stats(path).total_calls > 0
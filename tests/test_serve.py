@@ -0,0 +1,51 @@
+# tests/test_serve.py
+import argparse
+import os
+import signal
+import sys
+
+import pytest
+
+from backend import serve
+
+def test_backoff_doubles_on_fast_exits_and_gives_up():
+    b = serve._Backoff(base_s=0.5, max_s=3.0, fast_s=10.0, max_fast=5)
+    assert [b.next_delay(1.0) for _ in range(4)] == [0.5, 1.0, 2.0, 3.0]
+    assert b.next_delay(1.0) is None
+
+def test_backoff_resets_after_a_long_lived_child():
+    b = serve._Backoff(base_s=0.5, max_s=30.0, fast_s=10.0, max_fast=3)
+    assert [b.next_delay(1.0) for _ in range(2)] == [0.5, 1.0]
+    assert b.next_delay(60.0) == 0.5
+    assert [b.next_delay(1.0) for _ in range(2)] == [0.5, 1.0]
+
+@pytest.fixture
+def restore_signals():
+    saved = {s: signal.getsignal(s) for s in (signal.SIGINT, signal.SIGTERM)}
+    yield
+    for s, handler in saved.items():
+        signal.signal(s, handler)
+
+@pytest.mark.skipif(not hasattr(os, "fork") or sys.platform == "win32", reason="prefork needs os.fork()")
+def test_crashing_workers_are_logged_and_the_server_gives_up(monkeypatch, capfd, restore_signals):
+    from backend import api
+    def crash(sock, log_level):
+        raise RuntimeError("worker failed to start")
+    monkeypatch.setattr(serve, "_serve_worker", crash)
+    monkeypatch.setattr(serve, "RESTART_BACKOFF_S", 0.01)
+    monkeypatch.setattr(serve, "MAX_FAST_EXITS", 3)
+    monkeypatch.setattr(api, "STORE_COMPACT_INTERVAL", 0)
+    args = argparse.Namespace(host="127.0.0.1", port=0, workers=2, log_level="warning")
+    assert serve._prefork(args) == 1
+    out, err = capfd.readouterr()
+    assert "RuntimeError: worker failed to start" in err
+    assert out.count("restarting in") == 2   # the third fast exit in a row gives up
+    assert "3 fast exits in a row, shutting down" in out
+
+def test_warm_fills_the_sprite_cache():
+    from backend import warmup
+    from backend.export import instructions
+    timings = warmup.warm()
+    assert set(timings) == {"imports", "tables", "pipeline"}
+    expected = {(c, p["l"], p["w"]) for p in instructions.PART_BY_LDRAW.values() for c in instructions.COLOR_MAP}
+    assert expected <= set(instructions._sprites)
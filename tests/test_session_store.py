@@ -0,0 +1,207 @@
+# tests/test_session_store.py
+import os
+import stat
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.utils import session_store
+from backend.utils.fileio import atomic_open
+from backend.utils.session_store import SessionStore
+
+def _session(root, name, files):
+    outdir = os.path.join(root, name)
+    for rel, data in files.items():
+        path = os.path.join(outdir, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(data)
+    return outdir
+
+def _age(path, seconds):
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+def _age_session(outdir, seconds):
+    _age(os.path.join(outdir, session_store.MANIFEST), seconds)
+
+@pytest.fixture
+def hashes(monkeypatch):
+    calls = []
+    real = session_store.file_hash
+    def counting(path, *a, **kw):
+        calls.append(os.path.basename(path))
+        return real(path, *a, **kw)
+    monkeypatch.setattr(session_store, "file_hash", counting)
+    return calls
+
+def test_identical_sessions_share_one_blob(tmp_path):
+    root = str(tmp_path)
+    store = SessionStore(root)
+    a = _session(root, "session_a", {"model.ldr": b"same" * 100, "bom.csv": b"a"})
+    b = _session(root, "session_b", {"model.ldr": b"same" * 100, "bom.csv": b"b"})
+    store.commit(a)
+    stats = store.commit(b)
+    assert stats["deduplicated_bytes"] == 400
+    ia = os.stat(os.path.join(a, "model.ldr"))
+    ib = os.stat(os.path.join(b, "model.ldr"))
+    assert ia.st_ino == ib.st_ino and ia.st_nlink == 3   # two sessions + the blob
+    assert store.metrics()["deduplicated_bytes"] == 400
+
+def test_blobs_are_not_read_only(tmp_path):
+    root = str(tmp_path)
+    store = SessionStore(root)
+    a = _session(root, "session_a", {"model.ldr": b"x" * 10})
+    store.commit(a)
+    assert os.stat(os.path.join(a, "model.ldr")).st_mode & stat.S_IWUSR
+    session_store.remove_tree(a)
+    assert not os.path.exists(a)
+
+def test_remove_tree_removes_read_only_files(tmp_path):
+    a = _session(str(tmp_path), "session_a", {"model.ldr": b"x"})
+    os.chmod(os.path.join(a, "model.ldr"), stat.S_IRUSR)
+    session_store.remove_tree(a)
+    assert not os.path.exists(a)
+
+def test_second_commit_does_not_rehash(tmp_path, hashes):
+    root = str(tmp_path)
+    store = SessionStore(root)
+    a = _session(root, "session_a", {"model.ldr": b"x" * 10, "bom.csv": b"y"})
+    store.commit(a)
+    assert sorted(hashes) == ["bom.csv", "model.ldr"]
+    hashes.clear()
+    store.commit(a, touch=False)
+    assert hashes == []
+    # a lazily rendered page and a replaced file are ingested, nothing else
+    _session(root, "session_a", {"instructions/step_0.png": b"png"})
+    with atomic_open(os.path.join(a, "bom.csv"), "wb") as fh:
+        fh.write(b"z")
+    store.commit(a, touch=False)
+    assert sorted(hashes) == ["bom.csv", "step_0.png"]
+
+def test_no_rehash_without_hard_links(tmp_path, hashes, monkeypatch):
+    def no_links(src, dst):
+        raise OSError("hard links not supported")
+    monkeypatch.setattr(session_store.os, "link", no_links)
+    root = str(tmp_path)
+    store = SessionStore(root)
+    a = _session(root, "session_a", {"model.ldr": b"x" * 10})
+    store.commit(a)
+    assert os.stat(os.path.join(a, "model.ldr")).st_nlink == 1
+    hashes.clear()
+    store.compact()
+    store.compact()
+    assert hashes == []
+
+def test_ttl_expires_idle_sessions(tmp_path):
+    root = str(tmp_path)
+    store = SessionStore(root, ttl_s=3600)
+    old = _session(root, "session_old", {"model.ldr": b"old"})
+    new = _session(root, "session_new", {"model.ldr": b"new"})
+    store.commit(old)
+    store.commit(new)
+    _age_session(old, 7200)
+    result = store.compact()
+    assert result["expired"] == 1
+    assert not os.path.exists(old) and os.path.exists(new)
+    assert result["blobs_removed"] == 1   # the old session's blob went with it
+
+def test_quota_evicts_least_recently_used(tmp_path):
+    root = str(tmp_path)
+    names = ["session_0", "session_1", "session_2"]
+    store = SessionStore(root, quota_bytes=2800)   # two sessions and their manifests fit
+    for i, name in enumerate(names):
+        outdir = _session(root, name, {"model.ldr": bytes([i]) * 1000})
+        store.commit(outdir)
+        _age_session(outdir, 3600 - i * 600)
+    _age_session(os.path.join(root, "session_0"), 600)   # used again since: session_1 is the oldest
+    result = store.compact()
+    assert result["evicted"] == 1
+    assert sorted(n for n in os.listdir(root) if n.startswith("session_")) == ["session_0", "session_2"]
+    assert store.usage() <= 2800
+
+def test_recent_sessions_are_protected(tmp_path):
+    root = str(tmp_path)
+    store = SessionStore(root, quota_bytes=10)
+    store.commit(_session(root, "session_a", {"model.ldr": b"x" * 1000}))
+    assert store.compact()["evicted"] == 0
+
+def test_sweep_removes_unreferenced_blobs(tmp_path):
+    root = str(tmp_path)
+    store = SessionStore(root)
+    a = _session(root, "session_a", {"model.ldr": b"only here", "bom.csv": b"shared"})
+    b = _session(root, "session_b", {"bom.csv": b"shared"})
+    store.commit(a)
+    store.commit(b)
+    session_store.remove_tree(a)
+    assert store.sweep() == 1
+    blobs = [f for _, _, fs in os.walk(store.blobs) for f in fs]
+    assert blobs == [session_store.file_hash(os.path.join(b, "bom.csv"))]
+
+def test_cache_counts_towards_quota_and_is_evicted(tmp_path):
+    root = str(tmp_path / "outputs")
+    cache = os.path.join(root, ".lpub_cache")
+    os.makedirs(cache)
+    store = SessionStore(root, quota_bytes=1500, caches=[cache])
+    for i in range(3):
+        path = os.path.join(cache, f"{i}.pdf")
+        with open(path, "wb") as fh:
+            fh.write(bytes([i]) * 1000)
+        _age(path, 3600 - i * 600)
+    with open(os.path.join(cache, "3.pdf.1.2.tmp.pdf"), "wb") as fh:   # still rendering
+        fh.write(b"t" * 100)
+    assert store.usage() == 3100
+    result = store.compact()
+    assert result["cache_files_removed"] == 2
+    assert sorted(os.listdir(cache)) == ["2.pdf", "3.pdf.1.2.tmp.pdf"]
+
+def test_cache_files_expire(tmp_path):
+    root = str(tmp_path / "outputs")
+    cache = os.path.join(root, ".lpub_cache")
+    os.makedirs(cache)
+    store = SessionStore(root, ttl_s=3600, caches=[cache])
+    for name, age in (("old.pdf", 7200), ("new.pdf", 60)):
+        with open(os.path.join(cache, name), "wb") as fh:
+            fh.write(b"pdf")
+        _age(os.path.join(cache, name), age)
+    assert store.compact()["cache_files_removed"] == 1
+    assert os.listdir(cache) == ["new.pdf"]
+
+def test_api_lifespan_runs_the_compactor(tmp_path, monkeypatch):
+    from backend import api
+    monkeypatch.setattr(api, "OUTPUTS", str(tmp_path / "outputs"))
+    monkeypatch.setattr(api, "STORE_COMPACT_INTERVAL", 0.05)
+    monkeypatch.setattr(api.get_runner(), "cache_dir", str(tmp_path / "outputs" / ".lpub_cache"))
+    with TestClient(api.app) as client:
+        store = api.session_store()
+        assert store.caches == [os.path.normpath(api.get_runner().cache_dir)]
+        assert store._thread is not None and store._thread.is_alive()
+        deadline = time.time() + 5
+        while client.get("/store/metrics").json()["compactions"] == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        assert client.get("/store/metrics").json()["compactions"] > 0
+    assert store._thread is None
+
+def test_rerendering_a_session_leaves_linked_sessions_alone(tmp_path):
+    from backend.pipeline import run_pipeline
+    from backend.utils.spec_schema import DesignSpec
+    root = str(tmp_path)
+    store = SessionStore(root)
+    spec = DesignSpec(length_studs=12, width_studs=6, height_layers=3)
+    a, b = os.path.join(root, "session_a"), os.path.join(root, "session_b")
+    for outdir in (a, b):
+        run_pipeline(spec, outdir, stop_after="render")
+        store.commit(outdir)
+    page = os.path.join("instructions", "steps", "step_00.png")
+    assert os.path.samefile(os.path.join(a, page), os.path.join(b, page))
+    before = session_store.file_hash(os.path.join(a, page))
+
+    run_pipeline(spec, b, stop_after="render", catalog="full")   # re-render b in place
+    assert session_store.file_hash(os.path.join(b, page)) != before
+    assert session_store.file_hash(os.path.join(a, page)) == before
+    manifest = store._read_manifest(a)["files"]
+    for rel, entry in manifest.items():
+        path = os.path.join(a, rel)
+        assert session_store.file_hash(path) == entry["sha256"], rel
+        assert session_store.file_hash(store._blob_path(entry["sha256"])) == entry["sha256"], rel
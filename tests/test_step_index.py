@@ -0,0 +1,78 @@
+# tests/test_step_index.py
+import hashlib
+import os
+import random
+from collections import Counter
+
+import pytest
+
+from backend.geometry.voxelizer import make_voxels
+from backend.optimize.greedy_packer import pack_greedy
+from backend.pipeline import run_pipeline
+from backend.planners.step_index import StepIndex
+from backend.planners.step_planner import plan_steps_connectivity_batched
+from backend.utils.spec_schema import DesignSpec
+
+SPEC = DesignSpec(length_studs=12, width_studs=6, height_layers=4)
+
+# sha256[:16] of the exports before StepIndex existed (commit d213e70)
+GOLDEN = {
+    "basic": {
+        "model.ldr": "4b5279300e6b5c43", "bom.csv": "38ed53f7ba54b7d2", "bom.json": "2157dcd95bd11012",
+        "step_00.ldr": "b79f2c99101ce899", "step_01.ldr": "0f51613ca2ae44db", "step_02.ldr": "d9635318e6a0bc74",
+        "step_03.ldr": "204083eb523551b5", "step_04.ldr": "43a039d4e07e7637",
+    },
+    "full": {
+        "model.ldr": "0d0bf2d567b94c88", "bom.csv": "b4aa736d2066573a", "bom.json": "6844358f80ae1dd0",
+        "step_00.ldr": "1a1a26629c39bae3", "step_01.ldr": "f34e96bacf4c1416", "step_02.ldr": "d8206972adfe00fd",
+        "step_03.ldr": "bc01d0ec6af68027", "step_04.ldr": "cf581d872c008cce", "step_05.ldr": "d516702b9a9c38fe",
+        "step_06.ldr": "d93d39d5537ddde0", "step_07.ldr": "520a4adbd694acbb",
+    },
+}
+
+@pytest.mark.parametrize("catalog", sorted(GOLDEN))
+def test_ldraw_and_bom_are_byte_identical_to_the_pre_index_exporters(tmp_path, catalog):
+    run_pipeline(SPEC, str(tmp_path), catalog=catalog, stop_after="bom")
+    got = {}
+    for name in os.listdir(tmp_path):
+        with open(tmp_path / name, "rb") as fh:
+            got[name] = hashlib.sha256(fh.read()).hexdigest()[:16]
+    assert got == GOLDEN[catalog]
+
+@pytest.fixture(scope="module")
+def planned():
+    spec = DesignSpec(length_studs=16, width_studs=8, height_layers=6)
+    placements = pack_greedy(make_voxels(spec), seed=spec.seed, catalog="full")
+    placements, steps = plan_steps_connectivity_batched(placements, batch_size=8, log_every=0)
+    return placements, steps
+
+def test_index_agrees_with_a_direct_count(planned):
+    placements, steps = planned
+    shuffled = list(placements)
+    random.Random(0).shuffle(shuffled)
+    index = StepIndex(shuffled)
+    assert index.step_count == steps
+
+    def items(parts):
+        c = Counter((p["ldraw"], p["name"], p["color"]) for p in parts)
+        return sorted(((ld.replace(".dat", ""), name, col, n) for (ld, name, col), n in c.items()),
+                      key=lambda t: (t[0], t[2]))
+
+    def rows(bom):
+        return [(it["part_id"], it["name"], it["color"], it["quantity"]) for it in bom]
+
+    assert rows(index.bom()) == items(placements)
+    for s in range(steps):
+        this = [p for p in placements if p["step"] == s]
+        assert sorted(map(id, index.step(s))) == sorted(map(id, this))
+        assert sorted(map(id, index.before(s))) == sorted(id(p) for p in placements if p["step"] < s)
+        assert rows(index.bom(step=s)) == items(this)
+        assert rows(index.bom(upto=s)) == items([p for p in placements if p["step"] <= s])
+        assert [(ld, col, q) for ld, col, _, q, _, _ in index.pli(s)] == \
+            [(ld + ".dat", col, q) for ld, _, col, q in items(this)]
+    assert index.steps() == sorted({p["step"] for p in placements})
+
+def test_empty_and_unplanned_placements():
+    assert StepIndex([]).step_count == 0
+    index = StepIndex([{"x": 0, "y": 0, "w": 1, "l": 2, "ldraw": "3023.dat", "name": "Plate 1x2", "color": "red"}])
+    assert index.step_count == 1 and index.pli(0) == [("3023.dat", "red", "1x2", 1, 2, 1)]
@@ -0,0 +1,120 @@
+# tests/test_step_pages.py
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from backend.export import instructions
+from backend.export.instructions import render_step_page, step_png_path
+from backend.pipeline import run_pipeline
+from backend.utils.spec_schema import DesignSpec
+
+SPEC = DesignSpec(length_studs=8, width_studs=4, height_layers=2)
+
+@pytest.fixture
+def lazy_session(tmp_path):
+    outdir = str(tmp_path / "lazy")
+    res = run_pipeline(SPEC, outdir, page_url="/sessions/x/steps/{n}.png", pdf_url="/sessions/x/instructions.pdf")
+    return outdir, res["counts"]["steps"]
+
+def test_out_of_range_steps_leave_no_locks(lazy_session):
+    outdir, steps = lazy_session
+    for s in (999, 1000, -5, steps):
+        with pytest.raises(IndexError):
+            render_step_page(outdir, s)
+    assert instructions._page_locks == {}
+    assert not any(name.endswith(".tmp") for name in os.listdir(os.path.dirname(step_png_path(outdir, 0))))
+
+def test_failed_render_leaves_no_lock_or_temp_file(lazy_session, monkeypatch):
+    outdir, _ = lazy_session
+    def boom(*args, **kwargs):
+        raise RuntimeError("draw failed")
+    monkeypatch.setattr(instructions, "draw_step_image", boom)
+    with pytest.raises(RuntimeError):
+        render_step_page(outdir, 0)
+    assert instructions._page_locks == {}
+    assert os.listdir(os.path.dirname(step_png_path(outdir, 0))) == []
+
+def test_lazy_pages_match_eager_pages(tmp_path, lazy_session):
+    outdir, steps = lazy_session
+    eager = str(tmp_path / "eager")
+    run_pipeline(SPEC, eager)
+    for s in range(steps):
+        with open(render_step_page(outdir, s), "rb") as a, open(step_png_path(eager, s), "rb") as b:
+            assert a.read() == b.read()
+    assert instructions._page_locks == {}
+
+@pytest.mark.parametrize("catalog", ["basic", "full"])
+def test_pasted_thumbnails_match_drawing_them_in_place(tmp_path, catalog):
+    from PIL import Image, ImageChops, ImageDraw
+    from backend.planners.step_index import StepIndex
+    outdir = str(tmp_path / catalog)
+    spec = DesignSpec(length_studs=12, width_studs=6, height_layers=3)
+    run_pipeline(spec, outdir, batch_size=24, catalog=catalog, page_url="/p/{n}.png", pdf_url="/p.pdf")
+    with open(os.path.join(outdir, instructions.SESSION_MODEL), encoding="utf-8") as f:
+        model = json.load(f)
+    index = StepIndex(model["placements"])
+    scale = instructions._scale(model["W"], model["L"])
+    _, _, _, _, px, py, board_h = instructions._canvas(model["W"], model["L"], scale)
+    rows_per_col = max(1, int((board_h - 36) // (instructions.PLI_TH + instructions.PLI_GAP)))
+    columns = 0
+    for s in range(model["step_count"]):
+        path = str(tmp_path / f"{catalog}_{s}.png")
+        instructions.draw_step_image(model["placements"], s, model["W"], model["L"], path, index=index)
+        page = Image.open(path).convert("RGB")
+        redrawn = page.copy()
+        d = ImageDraw.Draw(redrawn)
+        # the same PLI layout as draw_step_image, drawing each thumbnail directly
+        col = row = 0
+        for (_, color, _, _, l, w) in index.pli(s):
+            if row >= rows_per_col:
+                col += 1; row = 0
+            cell = instructions._pli_cell_rect(px, py, col, row)
+            x0, y0 = cell[0] + 6, cell[1] + 4
+            box = (x0, y0, x0 + instructions._THUMB_SIZE[0] - 1, y0 + instructions._THUMB_SIZE[1] - 1)
+            instructions._draw_part_thumb_topdown(d, box, color, l, w)
+            row += 1
+        columns = max(columns, col + 1)
+        assert ImageChops.difference(page, redrawn).getbbox() is None, f"step {s}"
+    assert columns > 1   # the wrapped PLI layout is covered too
+
+def test_a_late_request_waits_for_the_render_in_progress(lazy_session, monkeypatch):
+    # A's render fails while B waits; B renders; C arrives during B's render and
+    # must queue on the same lock instead of rendering the page a second time
+    outdir, _ = lazy_session
+    real_draw = instructions.draw_step_image
+    calls, in_draw, release = [], [threading.Event() for _ in range(2)], [threading.Event() for _ in range(2)]
+    def draw(*args, **kwargs):
+        n = len(calls)
+        calls.append(n)
+        if n < 2:
+            in_draw[n].set()
+            release[n].wait(5)
+        if n == 0:
+            raise RuntimeError("draw failed")
+        real_draw(*args, **kwargs)
+    monkeypatch.setattr(instructions, "draw_step_image", draw)
+    errors = []
+    def request():
+        try:
+            render_step_page(outdir, 0)
+        except RuntimeError as e:
+            errors.append(e)
+    a, b, c = (threading.Thread(target=request) for _ in range(3))
+    a.start()
+    assert in_draw[0].wait(5)
+    b.start()
+    time.sleep(0.1)   # B is now waiting on the page lock
+    release[0].set()
+    assert in_draw[1].wait(5)
+    c.start()
+    time.sleep(0.1)
+    assert len(calls) == 2
+    release[1].set()
+    for t in (a, b, c):
+        t.join(5)
+    assert len(calls) == 2 and len(errors) == 1
+    assert os.path.isfile(step_png_path(outdir, 0))
+    assert instructions._page_locks == {}
@@ -0,0 +1,41 @@
+# tests/test_step_planner.py
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from backend.geometry.voxelizer import make_voxels
+from backend.optimize.greedy_packer import pack_greedy
+from backend.planners.step_planner import plan_steps_layered
+from backend.utils.spec_schema import DesignSpec
+
+@pytest.fixture(scope="module")
+def placements():
+    spec = DesignSpec(length_studs=16, width_studs=8, height_layers=6)
+    return pack_greedy(make_voxels(spec), seed=spec.seed)
+
+def _steps(placements, **kwargs):
+    pl = copy.deepcopy(placements)
+    _, count = plan_steps_layered(pl, batch_size=8, **kwargs)
+    return [p["step"] for p in pl], count, pl
+
+def test_layers_are_planned_bottom_up_without_mixing(placements):
+    steps, count, pl = _steps(placements)
+    assert sorted(set(steps)) == list(range(count))
+    by_step = {}
+    for p in pl:
+        by_step.setdefault(p["step"], set()).add(p["z"])
+    assert all(len(zs) == 1 for zs in by_step.values())
+    layer_of_step = [by_step[s].pop() for s in range(count)]
+    assert layer_of_step == sorted(layer_of_step)
+
+def test_serial_call_starts_no_processes(placements):
+    _steps(placements)
+    assert multiprocessing.active_children() == []
+
+@pytest.mark.parametrize("pool", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_executor_gives_the_serial_order(placements, pool):
+    serial = _steps(placements)[:2]
+    with pool(max_workers=2) as ex:
+        assert _steps(placements, executor=ex)[:2] == serial
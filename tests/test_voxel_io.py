@@ -0,0 +1,92 @@
+# tests/test_voxel_io.py
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from backend.geometry.voxel_io import MAX_DIM, count_occupied, layer_mask, load_voxels
+
+def _grid():
+    grid = np.zeros((3, 4, 10), dtype=np.uint8)
+    grid[0] = 1
+    grid[1, 1:3, 2:9] = 1
+    grid[2, 2, 5] = 1
+    return grid
+
+def _vox_bytes(grid, n=None):
+    Z, Y, X = grid.shape
+    z, y, x = np.nonzero(grid)
+    xyzi = np.stack([x, y, z, np.ones_like(x)], axis=1).astype(np.uint8).tobytes()
+    size = b"SIZE" + struct.pack("<ii", 12, 0) + struct.pack("<iii", X, Y, Z)
+    body = struct.pack("<i", len(x) if n is None else n) + xyzi
+    xyz = b"XYZI" + struct.pack("<ii", len(body), 0) + body
+    return b"VOX " + struct.pack("<i", 150) + b"MAIN" + struct.pack("<ii", 0, len(size + xyz)) + size + xyz
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+def _npz_bytes(**arrays):
+    buf = io.BytesIO()
+    np.savez(buf, **arrays)
+    return buf.getvalue()
+
+def _npy_bytes(arr):
+    buf = io.BytesIO()
+    np.save(buf, arr)
+    return buf.getvalue()
+
+def _dense(vox):
+    return np.stack([layer_mask(vox, z) for z in range(vox.shape[0])])
+
+@pytest.mark.parametrize("name,data", [
+    ("g.npy", _npy_bytes(_grid())),
+    ("g.npz", _npz_bytes(voxels=_grid())),
+    ("p.npz", _npz_bytes(packed=np.packbits(_grid(), axis=-1), shape=np.array(_grid().shape))),
+    ("g.vox", _vox_bytes(_grid())),
+])
+def test_formats_load_the_same_grid(tmp_path, name, data):
+    vox = load_voxels(_write(tmp_path, name, data))
+    assert vox.shape == _grid().shape
+    assert np.array_equal(_dense(vox), _grid())
+    assert count_occupied(vox) == int(_grid().sum())
+
+@pytest.mark.parametrize("name,data", [
+    ("bad.npy", b"not a numpy file at all"),
+    ("bad.npz", b"PK\x03\x04 but not really a zip"),
+    ("bad.vox", b"VOX \x96\x00\x00\x00garbage"),
+    ("empty.npy", b""),
+    ("empty.npz", b""),
+    ("empty.vox", b""),
+    ("float.npy", _npy_bytes(np.zeros((2, 2, 2), dtype=np.float32))),
+    ("two.npz", _npz_bytes(a=_grid(), b=_grid())),
+    ("noshape.npz", _npz_bytes(packed=np.packbits(_grid(), axis=-1))),
+    ("flat.npy", _npy_bytes(np.zeros((4, 4), dtype=np.uint8))),
+])
+def test_bad_inputs_raise_value_error(tmp_path, name, data):
+    with pytest.raises(ValueError):
+        load_voxels(_write(tmp_path, name, data))
+
+@pytest.mark.parametrize("name,data", [
+    ("g.npy", _npy_bytes(_grid())),
+    ("g.npz", _npz_bytes(voxels=_grid())),
+    ("g.vox", _vox_bytes(_grid())),
+])
+@pytest.mark.parametrize("keep", [0.3, 0.7, 0.95])
+def test_truncated_inputs_raise_value_error(tmp_path, name, data, keep):
+    with pytest.raises(ValueError):
+        load_voxels(_write(tmp_path, name, data[:int(len(data) * keep)]))
+
+def test_vox_voxel_count_past_end_of_file(tmp_path):
+    with pytest.raises(ValueError):
+        load_voxels(_write(tmp_path, "g.vox", _vox_bytes(_grid(), n=10_000)))
+
+@pytest.mark.parametrize("shape", [(MAX_DIM + 1, 1, 1), (1, 1, MAX_DIM + 1), (0, 4, 4)])
+def test_oversize_or_empty_dims_are_rejected(tmp_path, shape):
+    with pytest.raises(ValueError, match="dims"):
+        load_voxels(_write(tmp_path, "g.npy", _npy_bytes(np.zeros(shape, dtype=np.uint8))))
+    packed = _npz_bytes(packed=np.zeros((1, 1, 1), dtype=np.uint8), shape=np.array(shape))
+    with pytest.raises(ValueError, match="dims"):
+        load_voxels(_write(tmp_path, "p.npz", packed))